@@ -1,6 +1,18 @@
-from typing import Annotated
-
-from sqlalchemy import ForeignKey, String
+from datetime import UTC, datetime
+from typing import Annotated, Any
+
+from sqlalchemy import (
+    DDL,
+    JSON,
+    ColumnClause,
+    DateTime,
+    ForeignKey,
+    Index,
+    String,
+    event,
+    func,
+    literal_column,
+)
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -13,8 +25,13 @@ from app.permissions import Role
 
 IntPK = Annotated[int, mapped_column(primary_key=True)]
 UniqueStr = Annotated[str, mapped_column(unique=True)]
-UsersFk = Annotated[int, mapped_column(ForeignKey("users.id"))]
+UsersFk = Annotated[int, mapped_column(ForeignKey("users.id", ondelete="CASCADE"))]
 str100 = Annotated[str, 100]
+JsonDict = dict[str, Any]
+
+
+def utcnow() -> datetime:
+    return datetime.now(UTC)
 
 
 class Base(DeclarativeBase):
@@ -22,6 +39,8 @@ class Base(DeclarativeBase):
 
     type_annotation_map = {
         str100: String(100),
+        JsonDict: JSON,
+        datetime: DateTime(timezone=True),
     }
 
 
@@ -33,6 +52,12 @@ class Todo(Base):
     """
 
     __tablename__ = "todos"
+    # AUTOINCREMENT: SQLite would otherwise reuse the id of a deleted (or
+    # archived) todo that had the highest id.
+    __table_args__ = (
+        Index("ix_todos_owner_id_updated_at", "owner_id", "updated_at"),
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[IntPK]
     title: Mapped[str]
@@ -40,10 +65,99 @@ class Todo(Base):
     priority: Mapped[int]
     completed: Mapped[bool] = mapped_column(default=False)
     owner_id: Mapped[UsersFk]
+    updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
+    version: Mapped[int] = mapped_column(default=1)
 
     owner: Mapped["User"] = relationship("User", back_populates="todos")
 
 
+# ----------- Todo full-text search -----------
+# Postgres: a GIN index on a weighted tsvector expression. Queries must use the
+# exact same expression (`todo_search_vector`) for the index to be picked up.
+SEARCH_CONFIG: ColumnClause[Any] = literal_column("'english'::regconfig")
+
+
+def _weighted_tsvector(column, weight: str):
+    return func.setweight(
+        func.to_tsvector(SEARCH_CONFIG, column), literal_column(f"'{weight}'")
+    )
+
+
+todo_search_vector = _weighted_tsvector(Todo.title, "A").op("||")(
+    _weighted_tsvector(Todo.description, "B")
+)
+Index(
+    "ix_todos_search", todo_search_vector, postgresql_using="gin"
+).ddl_if(dialect="postgresql")
+
+# SQLite: an FTS5 external-content table over todos (it stores only the index,
+# not a copy of the text), kept in sync by triggers.
+TODO_FTS_TABLE = "todos_fts"
+TODO_FTS_DDL = (
+    (
+        f"CREATE VIRTUAL TABLE {TODO_FTS_TABLE} USING fts5("
+        "title, description, content='todos', content_rowid='id', prefix='2 3')"
+    ),
+    (
+        f"CREATE TRIGGER {TODO_FTS_TABLE}_ai AFTER INSERT ON todos BEGIN "
+        f"INSERT INTO {TODO_FTS_TABLE}(rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END"
+    ),
+    (
+        f"CREATE TRIGGER {TODO_FTS_TABLE}_ad AFTER DELETE ON todos BEGIN "
+        f"INSERT INTO {TODO_FTS_TABLE}({TODO_FTS_TABLE}, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END"
+    ),
+    (
+        f"CREATE TRIGGER {TODO_FTS_TABLE}_au AFTER UPDATE OF title, description "
+        "ON todos BEGIN "
+        f"INSERT INTO {TODO_FTS_TABLE}({TODO_FTS_TABLE}, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        f"INSERT INTO {TODO_FTS_TABLE}(rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END"
+    ),
+)
+for _statement in TODO_FTS_DDL:
+    event.listen(
+        Todo.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    Todo.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {TODO_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+class ArchivedTodo(Base):
+    """Completed todo moved out of `todos` by the archival policy (cold storage)"""
+
+    __tablename__ = "archived_todos"
+
+    id: Mapped[IntPK]
+    title: Mapped[str]
+    description: Mapped[str100]
+    priority: Mapped[int]
+    completed: Mapped[bool] = mapped_column(default=True)
+    owner_id: Mapped[UsersFk] = mapped_column(index=True)
+    updated_at: Mapped[datetime]
+    version: Mapped[int]
+    archived_at: Mapped[datetime] = mapped_column(default=utcnow)
+
+
+class TodoTombstone(Base):
+    """Deleted todo, kept for a while so delta sync clients learn of the deletion"""
+
+    __tablename__ = "todo_tombstones"
+    __table_args__ = (
+        Index("ix_todo_tombstones_owner_id_deleted_at", "owner_id", "deleted_at"),
+    )
+
+    id: Mapped[IntPK]
+    todo_id: Mapped[int]
+    owner_id: Mapped[int]
+    deleted_at: Mapped[datetime] = mapped_column(default=utcnow)
+
+
 class User(Base, mixins.AuthUserMixin):
     """User model"""
 
@@ -59,7 +173,57 @@ class User(Base, mixins.AuthUserMixin):
     hashed_password: Mapped[str]
     role: Mapped[Role]
     is_active: Mapped[bool] = mapped_column(default=False)
-
+    version: Mapped[int] = mapped_column(default=1)
+    # Maintained by the todo create/update/delete paths (services.todos).
+    # Archived todos still count as done.
+    open_count: Mapped[int] = mapped_column(default=0)
+    done_count: Mapped[int] = mapped_column(default=0)
+
+    # The database deletes a user's todos (ON DELETE CASCADE), so they're never
+    # loaded just to be deleted.
     todos: Mapped[list[Todo]] = relationship(
-        "Todo", back_populates="owner", cascade="all, delete"
+        "Todo", back_populates="owner", cascade="all, delete", passive_deletes=True
     )
+
+
+class WebSession(Base):
+    """Server-side session data, keyed by the id stored in the session cookie"""
+
+    __tablename__ = "sessions"
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    data: Mapped[JsonDict]
+    expires_at: Mapped[datetime] = mapped_column(index=True)
+
+
+class IdempotencyKey(Base):
+    """Response stored for a request made with an Idempotency-Key header"""
+
+    __tablename__ = "idempotency_keys"
+
+    # Hash of who made the request, its method and path, and the client's key
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64))
+    # None while the first request with the key is still running
+    status_code: Mapped[int | None]
+    headers: Mapped[JsonDict | None]
+    body: Mapped[bytes | None]
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
+    expires_at: Mapped[datetime] = mapped_column(index=True)
+
+
+class Job(Base):
+    """Background job, persisted so queued work survives a restart"""
+
+    __tablename__ = "jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str]
+    status: Mapped[str] = mapped_column(index=True)
+    payload: Mapped[JsonDict]
+    result: Mapped[JsonDict | None]
+    error: Mapped[str | None]
+    owner_id: Mapped[int | None]
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
+    started_at: Mapped[datetime | None]
+    finished_at: Mapped[datetime | None]
@@ -0,0 +1,98 @@
+"""SQL statement counting and timing, per request.
+
+Engine event hooks time every statement run on `database.engine`. While a
+`QueryStats` is active in the current context (see `track_queries`), each
+statement's count and time are added to it. Statements slower than
+`SLOW_QUERY_THRESHOLD` are logged with normalized SQL, and the route that ran
+them, wherever they come from.
+"""
+import logging
+import re
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+
+from app.datastore.database import engine
+
+logger = logging.getLogger(__name__)
+
+# ----------- Constants -----------
+SLOW_QUERY_THRESHOLD = 0.1  # seconds
+_START_TIMES = "query_start_times"
+
+_PLACEHOLDER = r"(?:\?|%\(\w+\)s|%s|:\w+|\$\d+)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class QueryStats:
+    """Statements run (and their total time) for one request."""
+
+    route: str
+    count: int = 0
+    duration: float = 0.0  # seconds
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar(
+    "query_stats", default=None
+)
+
+
+@contextmanager
+def track_queries(route: str) -> Iterator[QueryStats]:
+    """Count and time the statements run in this context (and its threads)."""
+    stats = QueryStats(route=route)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def normalize_sql(statement: str) -> str:
+    """Collapse literals, placeholder lists and whitespace, to group queries."""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(?, ...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+# ----------- Engine events -----------
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    conn.info.setdefault(_START_TIMES, []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    elapsed = time.perf_counter() - conn.info[_START_TIMES].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+    if elapsed >= SLOW_QUERY_THRESHOLD:
+        logger.warning(
+            "Slow query (%.1f ms) in %s: %s",
+            elapsed * 1000,
+            stats.route if stats is not None else "<no request>",
+            normalize_sql(statement),
+        )
+
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(exception_context) -> None:
+    """Drop the failed statement's start time, so later timings stay paired."""
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_START_TIMES):
+        connection.info[_START_TIMES].pop()
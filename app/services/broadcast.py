@@ -0,0 +1,120 @@
+"""In-process pub/sub hub for todo changes.
+
+Todo create/update/delete paths publish a small per-todo event, and each
+connected client (a browser tab or API stream) gets its own bounded queue of
+the owner's events. An idle subscriber costs one queue and one suspended
+coroutine. A consumer that falls a whole queue behind has its backlog dropped
+and gets a single `resync` event instead, so a slow client can't make the hub
+buffer without bound.
+"""
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.datastore import db_models
+
+# ----------- Constants -----------
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+RESYNC = "resync"
+QUEUE_SIZE = 100
+HEARTBEAT_INTERVAL = 15.0  # seconds
+CLIENT_ID_HEADER = "X-Client-Id"
+
+
+@dataclass(frozen=True)
+class TodoEvent:
+    """A change to one todo. `fields` holds the todo's new field values."""
+
+    action: str
+    todo_id: int
+    owner_id: int
+    fields: dict[str, Any] = field(default_factory=dict)
+    origin: str | None = None  # client id that made the change
+
+
+class Subscription:
+    """One connected client's bounded queue of events."""
+
+    def __init__(self, user_id: int, client_id: str | None, maxsize: int):
+        self.user_id = user_id
+        self.client_id = client_id
+        self.queue: asyncio.Queue[TodoEvent] = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, event: TodoEvent) -> None:
+        if event.origin is not None and event.origin == self.client_id:
+            return  # the client already applied its own change
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(
+                TodoEvent(action=RESYNC, todo_id=0, owner_id=self.user_id)
+            )
+
+
+class BroadcastHub:
+    """Fan todo events out to every subscription of the todo's owner."""
+
+    def __init__(
+        self, queue_size: int = QUEUE_SIZE, heartbeat: float = HEARTBEAT_INTERVAL
+    ):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscriptions: defaultdict[int, set[Subscription]] = defaultdict(set)
+
+    def publish(self, event: TodoEvent) -> None:
+        for subscription in self._subscriptions.get(event.owner_id, ()):
+            subscription.offer(event)
+
+    def subscribe(self, user_id: int, client_id: str | None = None) -> Subscription:
+        subscription = Subscription(user_id, client_id, maxsize=self.queue_size)
+        self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+
+    async def listen(
+        self, user_id: int, client_id: str | None = None
+    ) -> AsyncIterator[TodoEvent | None]:
+        """Yield the user's events, or None every `heartbeat` seconds when idle."""
+        subscription = self.subscribe(user_id, client_id)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(
+                        subscription.queue.get(), timeout=self.heartbeat
+                    )
+                except TimeoutError:
+                    yield None
+        finally:
+            self.unsubscribe(subscription)
+
+
+# ----------- Helpers -----------
+def todo_fields(todo: db_models.Todo) -> dict[str, Any]:
+    return {
+        "title": todo.title,
+        "description": todo.description,
+        "priority": todo.priority,
+        "completed": todo.completed,
+    }
+
+
+def format_sse(event: str, data: str) -> str:
+    """Format a Server-Sent Events message, prefixing each data line."""
+    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+    return f"event: {event}\n{lines}\n"
+
+
+todo_hub = BroadcastHub()
@@ -0,0 +1,217 @@
+"""Stored responses for requests made with an Idempotency-Key.
+
+The first request with a key reserves it (a row with no response yet), runs,
+and stores its response; retries with the same key get that response back
+without running again. Rows live in the `idempotency_keys` table, so they are
+shared by worker processes and survive restarts, behind an in-process LRU of
+completed responses so most retries skip the database.
+
+A reservation that never got a response (the process died) is given up
+after `RESERVATION_TIMEOUT`. Keys expire after `IDEMPOTENCY_TTL`. Expired
+rows are ignored on lookup, and deleted in batches by a background job,
+submitted at most every `PURGE_INTERVAL`.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+from sqlalchemy import CursorResult, and_, delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgres_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+
+from app.datastore import db_models
+from app.datastore.database import SessionLocal
+from app.services.jobs import job_runner
+
+# ----------- Constants -----------
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# A reservation still without a response after this was left by a crash
+RESERVATION_TIMEOUT = timedelta(minutes=5)
+CACHE_MAX_ENTRIES = 10_000
+PURGE_BATCH_SIZE = 10_000
+PURGE_INTERVAL = 60 * 60  # seconds
+PURGE_IDEMPOTENCY_KEYS_JOB = "purge_idempotency_keys"
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    request_hash: str
+    # None while the first request with the key is still running
+    status_code: int | None
+    headers: dict[str, str]
+    body: bytes
+
+
+class IdempotencyStore:
+    """Responses by idempotency key: an LRU of completed ones, then the table."""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        ttl: timedelta = IDEMPOTENCY_TTL,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache: OrderedDict[str, tuple[float, StoredResponse]] = OrderedDict()
+        # The store is called from the threadpool
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def reserve(self, key: str, request_hash: str) -> StoredResponse | None:
+        """Claim `key` for a new request, returning None.
+
+        If the key is already claimed, return what's stored for it instead:
+        the response, or one without a status code if it's still running.
+        """
+        if stored := self._cached(key):
+            return stored
+        now = db_models.utcnow()
+        with self.session_factory.begin() as db:
+            db.execute(
+                delete(db_models.IdempotencyKey).where(
+                    db_models.IdempotencyKey.id == key,
+                    or_(
+                        db_models.IdempotencyKey.expires_at <= now,
+                        and_(
+                            db_models.IdempotencyKey.status_code.is_(None),
+                            db_models.IdempotencyKey.created_at
+                            <= now - RESERVATION_TIMEOUT,
+                        ),
+                    ),
+                )
+            )
+            insert = (
+                postgres_insert
+                if db.get_bind().dialect.name == "postgresql"
+                else sqlite_insert
+            )
+            result = db.execute(
+                insert(db_models.IdempotencyKey)
+                .values(
+                    id=key,
+                    request_hash=request_hash,
+                    created_at=now,
+                    expires_at=now + self.ttl,
+                )
+                .on_conflict_do_nothing(index_elements=[db_models.IdempotencyKey.id])
+            )
+            if result.rowcount:
+                return None
+            row = db.scalar(
+                select(db_models.IdempotencyKey).where(
+                    db_models.IdempotencyKey.id == key
+                )
+            )
+        if row is None:  # expired and purged in between: let the request run
+            return None
+        stored = StoredResponse(
+            request_hash=row.request_hash,
+            status_code=row.status_code,
+            headers=row.headers or {},
+            body=row.body or b"",
+        )
+        if stored.status_code is not None:
+            self._remember(key, stored)
+        return stored
+
+    def complete(
+        self,
+        key: str,
+        request_hash: str,
+        status_code: int,
+        headers: dict[str, str],
+        body: bytes,
+    ) -> None:
+        """Store the response of the request that reserved `key`."""
+        with self.session_factory.begin() as db:
+            db.execute(
+                update(db_models.IdempotencyKey)
+                .where(db_models.IdempotencyKey.id == key)
+                .values(status_code=status_code, headers=headers, body=body)
+            )
+        self._remember(
+            key,
+            StoredResponse(
+                request_hash=request_hash,
+                status_code=status_code,
+                headers=headers,
+                body=body,
+            ),
+        )
+
+    def release(self, key: str) -> None:
+        """Drop a reservation without storing a response, so a retry runs."""
+        with self.session_factory.begin() as db:
+            db.execute(
+                delete(db_models.IdempotencyKey).where(
+                    db_models.IdempotencyKey.id == key
+                )
+            )
+
+    def purge_expired(self, batch_size: int = PURGE_BATCH_SIZE) -> int:
+        """Delete expired keys in batches, returning the number deleted.
+
+        Each batch is its own short transaction, so a large backlog never
+        holds one long write lock.
+        """
+        deleted = 0
+        batch_ids = (
+            select(db_models.IdempotencyKey.id)
+            .where(db_models.IdempotencyKey.expires_at <= db_models.utcnow())
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        while True:
+            with self.session_factory.begin() as db:
+                result: CursorResult = db.execute(
+                    delete(db_models.IdempotencyKey)
+                    .where(db_models.IdempotencyKey.id.in_(batch_ids))
+                    .execution_options(synchronize_session=False)
+                )
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
+
+    def schedule_purge(self) -> None:
+        """Submit the purge job, if it hasn't been for `PURGE_INTERVAL`.
+
+        Call from the event loop, as the job runner's queue isn't thread-safe.
+        """
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        job_runner.submit(PURGE_IDEMPOTENCY_KEYS_JOB, {})
+
+    def _cached(self, key: str) -> StoredResponse | None:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires_at, stored = entry
+            if expires_at < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return stored
+
+    def _remember(self, key: str, stored: StoredResponse) -> None:
+        expires_at = time.monotonic() + self.ttl.total_seconds()
+        with self._lock:
+            self._cache[key] = (expires_at, stored)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+
+idempotency_store = IdempotencyStore()
+
+
+@job_runner.register(PURGE_IDEMPOTENCY_KEYS_JOB)
+def purge_idempotency_keys_job(payload: dict[str, Any]) -> dict[str, Any]:
+    return {"keys_deleted": idempotency_store.purge_expired()}
@@ -0,0 +1,152 @@
+"""In-process background jobs.
+
+Jobs are rows in the `jobs` table, so they can be polled and survive restarts,
+and are run by a small pool of asyncio workers fed from an in-memory queue.
+Handlers are plain (blocking) functions and run in worker threads, so a long
+job never blocks the event loop or a request.
+
+A worker claims a job with a conditional UPDATE (queued -> running), so a job
+is only run once even when several processes pick it up after a restart.
+"""
+import asyncio
+import logging
+import uuid
+from collections.abc import Callable
+from datetime import timedelta
+from typing import Any
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.datastore import db_models
+from app.datastore.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# ----------- Constants -----------
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+WORKERS = 2
+# Jobs left running this long were orphaned by a crash, and are run again.
+STALE_AFTER = timedelta(hours=1)
+
+JobHandler = Callable[[dict[str, Any]], dict[str, Any] | None]
+
+
+class JobRunner:
+    """Queue, persist and run registered kinds of background job."""
+
+    def __init__(
+        self, session_factory: sessionmaker = SessionLocal, workers: int = WORKERS
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.handlers: dict[str, JobHandler] = {}
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    def register(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        """Register a handler for a kind of job."""
+
+        def decorator(handler: JobHandler) -> JobHandler:
+            self.handlers[kind] = handler
+            return handler
+
+        return decorator
+
+    def submit(
+        self, kind: str, payload: dict[str, Any], owner_id: int | None = None
+    ) -> db_models.Job:
+        """Persist a new job and queue it to run."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = db_models.Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status=QUEUED,
+            payload=payload,
+            owner_id=owner_id,
+        )
+        with self.session_factory.begin() as db:
+            db.add(job)
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def start(self) -> None:
+        """Queue jobs left over from a previous run, and start the workers."""
+        stale_before = db_models.utcnow() - STALE_AFTER
+        with self.session_factory() as db:
+            job_ids = db.scalars(
+                select(db_models.Job.id).where(
+                    or_(
+                        db_models.Job.status == QUEUED,
+                        (db_models.Job.status == RUNNING)
+                        & (db_models.Job.started_at < stale_before),
+                    )
+                )
+            ).all()
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        self._tasks = [
+            asyncio.create_task(self._work()) for _ in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Stop the workers. Jobs still queued are picked up on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.run, job_id)
+            finally:
+                self._queue.task_done()
+
+    def run(self, job_id: str) -> None:
+        """Claim and run a job, recording its result or error."""
+        stale_before = db_models.utcnow() - STALE_AFTER
+        with self.session_factory.begin() as db:
+            claimed = db.execute(
+                update(db_models.Job)
+                .where(
+                    db_models.Job.id == job_id,
+                    or_(
+                        db_models.Job.status == QUEUED,
+                        (db_models.Job.status == RUNNING)
+                        & (db_models.Job.started_at < stale_before),
+                    ),
+                )
+                .values(status=RUNNING, started_at=db_models.utcnow())
+                .returning(db_models.Job.kind, db_models.Job.payload)
+                .execution_options(synchronize_session=False)
+            ).first()
+        if claimed is None:
+            return  # already taken by another worker
+        kind, payload = claimed
+        values: dict[str, Any]
+        try:
+            result = self.handlers[kind](payload)
+            values = {"status": SUCCEEDED, "result": result}
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, kind)
+            values = {"status": FAILED, "error": str(e) or type(e).__name__}
+        with self.session_factory.begin() as db:
+            db.execute(
+                update(db_models.Job)
+                .where(db_models.Job.id == job_id)
+                .values(**values, finished_at=db_models.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+
+
+def get_job(db: Session, job_id: str) -> db_models.Job | None:
+    return db.get(db_models.Job, job_id)
+
+
+job_runner = JobRunner()
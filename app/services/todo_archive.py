@@ -0,0 +1,108 @@
+"""Archival of old completed todos.
+
+Completed todos that haven't changed for `ARCHIVE_AFTER` are moved from
+`todos` to `archived_todos`, so the hot table (and every list query and page
+render) only holds todos that are still in use. Todos are moved in batches,
+each in its own short transaction, so archiving a large backlog never holds a
+long write lock.
+
+Archived todos leave the todo list like a deletion (a tombstone is recorded
+for delta sync clients) but still count as done, and are read back with
+`get_archived_todos`.
+"""
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.datastore import db_models
+from app.datastore.database import SessionLocal
+from app.services import todo_sync
+from app.services.jobs import job_runner
+
+# ----------- Constants -----------
+ARCHIVE_AFTER = timedelta(days=90)
+ARCHIVE_BATCH_SIZE = 1_000
+ARCHIVE_TODOS_JOB = "archive_todos"
+
+_ARCHIVED_COLUMNS = (
+    db_models.Todo.id,
+    db_models.Todo.title,
+    db_models.Todo.description,
+    db_models.Todo.priority,
+    db_models.Todo.completed,
+    db_models.Todo.owner_id,
+    db_models.Todo.updated_at,
+    db_models.Todo.version,
+)
+
+
+def archive_completed_todos(
+    session_factory: sessionmaker = SessionLocal,
+    older_than: timedelta = ARCHIVE_AFTER,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    """Move completed todos not updated for `older_than` to the archive.
+
+    Returns the number of todos archived.
+    """
+    cutoff = db_models.utcnow() - older_than
+    archived = 0
+    while True:
+        with session_factory.begin() as db:
+            moved = _archive_batch(db=db, cutoff=cutoff, batch_size=batch_size)
+        archived += moved
+        if moved < batch_size:
+            return archived
+
+
+def _archive_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    is_archivable = db_models.Todo.completed.is_(True) & (
+        db_models.Todo.updated_at < cutoff
+    )
+    batch_ids = (
+        select(db_models.Todo.id)
+        .where(is_archivable)
+        .order_by(db_models.Todo.id)
+        .limit(batch_size)
+    )
+    # DELETE ... RETURNING, so a todo changed since the batch was picked (and
+    # no longer archivable) is left alone.
+    rows = (
+        db.execute(
+            delete(db_models.Todo)
+            .where(db_models.Todo.id.in_(batch_ids), is_archivable)
+            .returning(*_ARCHIVED_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        .mappings()
+        .all()
+    )
+    if not rows:
+        return 0
+    db.execute(insert(db_models.ArchivedTodo), [dict(row) for row in rows])
+    for row in rows:
+        todo_sync.record_deletion(db=db, todo_id=row["id"], owner_id=row["owner_id"])
+    return len(rows)
+
+
+def get_archived_todos(
+    db: Session, owner_id: int | None = None
+) -> list[db_models.ArchivedTodo]:
+    """Get an owner's archived todos (everyone's if `owner_id` is None)."""
+    query = select(db_models.ArchivedTodo).order_by(db_models.ArchivedTodo.id)
+    if owner_id is not None:
+        query = query.where(db_models.ArchivedTodo.owner_id == owner_id)
+    return list(db.scalars(query))
+
+
+@job_runner.register(ARCHIVE_TODOS_JOB)
+def archive_todos_job(payload: dict[str, Any]) -> dict[str, Any]:
+    """Run the archival policy. `older_than_days` overrides `ARCHIVE_AFTER`."""
+    older_than = (
+        timedelta(days=payload["older_than_days"])
+        if "older_than_days" in payload
+        else ARCHIVE_AFTER
+    )
+    return {"todos_archived": archive_completed_todos(older_than=older_than)}
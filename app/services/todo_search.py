@@ -0,0 +1,91 @@
+"""Full-text search over todo titles and descriptions.
+
+Uses whichever index the database has (see `db_models`): an FTS5 table on
+SQLite, or a GIN-indexed tsvector on Postgres. Every word of the query must
+match, each as a prefix ("gro mil" finds "Groceries: milk"). Results are
+ranked, with title matches above description matches, and paginated.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import (
+    ColumnClause,
+    Select,
+    column,
+    func,
+    literal_column,
+    select,
+    table,
+)
+from sqlalchemy.orm import Session
+
+from app.datastore import db_models
+
+# ----------- Constants -----------
+MAX_TERMS = 10
+# bm25() column weights for (title, description)
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TERM_PATTERN = re.compile(r"\w+")
+_todos_fts = table(db_models.TODO_FTS_TABLE, column("rowid"))
+
+
+@dataclass
+class SearchPage:
+    todos: list[db_models.Todo]
+    next_offset: int | None
+
+
+def search_todos(
+    db: Session, owner_id: int, query: str, limit: int, offset: int = 0
+) -> SearchPage:
+    """Search the owner's todos, best match first."""
+    terms = parse_terms(query)
+    if not terms:
+        return SearchPage(todos=[], next_offset=None)
+    if db.get_bind().dialect.name == "postgresql":
+        statement = _postgres_search(terms)
+    else:
+        statement = _sqlite_search(terms)
+    # Fetch one extra row to know whether there's a next page.
+    todos = list(
+        db.scalars(
+            statement.where(db_models.Todo.owner_id == owner_id)
+            .limit(limit + 1)
+            .offset(offset)
+        )
+    )
+    next_offset = offset + limit if len(todos) > limit else None
+    return SearchPage(todos=todos[:limit], next_offset=next_offset)
+
+
+def parse_terms(query: str) -> list[str]:
+    """Split a user's query into plain words, dropping any search syntax."""
+    return _TERM_PATTERN.findall(query.lower())[:MAX_TERMS]
+
+
+# ----------- Dialects -----------
+def _sqlite_search(terms: list[str]) -> Select:
+    match = " ".join(f'"{term}"*' for term in terms)
+    fts: ColumnClause[Any] = literal_column(db_models.TODO_FTS_TABLE)
+    rank = func.bm25(fts, TITLE_WEIGHT, DESCRIPTION_WEIGHT)
+    return (
+        select(db_models.Todo)
+        .join(_todos_fts, _todos_fts.c.rowid == db_models.Todo.id)
+        .where(fts.match(match))
+        .order_by(rank, db_models.Todo.id)  # bm25: lower is better
+    )
+
+
+def _postgres_search(terms: list[str]) -> Select:
+    tsquery = func.to_tsquery(
+        db_models.SEARCH_CONFIG, " & ".join(f"{term}:*" for term in terms)
+    )
+    rank = func.ts_rank(db_models.todo_search_vector, tsquery)
+    return (
+        select(db_models.Todo)
+        .where(db_models.todo_search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), db_models.Todo.id)
+    )
@@ -1,23 +1,287 @@
-from typing import cast
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, cast
 
+from sqlalchemy import CursorResult, Row, delete, func, select, update
 from sqlalchemy.orm import Session
 
 from app.datastore import db_models
+from app.datastore.database import SessionLocal
+from app.services.jobs import job_runner
 
+EXPORT_TODOS_JOB = "export_todos"
+RECONCILE_COUNTS_JOB = "reconcile_todo_counts"
+TODO_FIELDS = ("id", "title", "description", "priority", "completed")
 
-async def get_todos_list(db: Session, current_user: db_models.User):
-    query = db.query(db_models.Todo).filter(db_models.Todo.owner_id == current_user.id)
-    return cast(list[db_models.Todo], query.all())
+
+@dataclass
+class TodoPage:
+    todos: list[Row]
+    next_offset: int | None
+
+
+def get_todo_rows(
+    db: Session,
+    owner_id: int | None = None,
+    include_archived: bool = False,
+    fields: Sequence[str] = TODO_FIELDS,
+) -> list[Row]:
+    """Get todos (everyone's if `owner_id` is None) as plain rows.
+
+    Only the given fields are selected, into lightweight `Row` tuples (with
+    attribute access), skipping ORM instances, the identity map and change
+    tracking. Archived todos, if included, come after the others.
+    """
+    models = (
+        (db_models.Todo, db_models.ArchivedTodo)
+        if include_archived
+        else (db_models.Todo,)
+    )
+    rows: list[Row] = []
+    for model in models:
+        query = select(*(getattr(model, name) for name in fields))
+        if owner_id is not None:
+            query = query.where(model.owner_id == owner_id)
+        rows.extend(db.execute(query).all())
+    return rows
+
+
+def get_todo_page(
+    db: Session,
+    owner_id: int,
+    limit: int,
+    offset: int = 0,
+    fields: Sequence[str] = TODO_FIELDS,
+) -> TodoPage:
+    """Get a page of the owner's todos' `fields`, by id."""
+    query = (
+        select(*(getattr(db_models.Todo, name) for name in fields))
+        .where(db_models.Todo.owner_id == owner_id)
+        .order_by(db_models.Todo.id)
+        # Fetch one extra row to know whether there's a next page.
+        .limit(limit + 1)
+        .offset(offset)
+    )
+    rows = list(db.execute(query).all())
+    next_offset = offset + limit if len(rows) > limit else None
+    return TodoPage(todos=rows[:limit], next_offset=next_offset)
+
+
+def get_todo_fields(
+    db: Session,
+    todo_id: int,
+    fields: Sequence[str] = TODO_FIELDS,
+    owner_fields: Sequence[str] | None = None,
+    owner_id: int | None = None,
+) -> Row | None:
+    """Get a todo's `fields` and version, as a row; None if not found.
+
+    The owner is only joined if `owner_fields` are asked for, labelled
+    `owner.<field>`. If `owner_id` is given the todo must belong to them.
+    """
+    query = select(
+        *(getattr(db_models.Todo, name) for name in fields), db_models.Todo.version
+    ).where(db_models.Todo.id == todo_id)
+    if owner_fields is not None:
+        owner_columns = (
+            getattr(db_models.User, name).label(f"owner.{name}")
+            for name in owner_fields
+        )
+        query = query.join(db_models.Todo.owner).add_columns(*owner_columns)
+    if owner_id is not None:
+        query = query.where(db_models.Todo.owner_id == owner_id)
+    return db.execute(query).first()
 
 
 async def add_todo(db: Session, current_user: db_models.User, title: str):
-    todo = db_models.Todo(
+    todo = create_todo(
+        db=db,
+        owner_id=current_user.id,
         title=title,
         description="Doesn't matter...",
         priority=1,
-        owner_id=current_user.id,
         completed=False,
     )
-    db.add(todo)
     db.commit()
     return todo
+
+
+def create_todo(
+    db: Session,
+    owner_id: int,
+    title: str,
+    description: str,
+    priority: int,
+    completed: bool,
+) -> db_models.Todo:
+    """Add a todo and count it on its owner, in the caller's transaction."""
+    todo = db_models.Todo(
+        title=title,
+        description=description,
+        priority=priority,
+        completed=completed,
+        owner_id=owner_id,
+    )
+    db.add(todo)
+    _adjust_count(db=db, owner_id=owner_id, completed=completed, delta=1)
+    return todo
+
+
+def update_todo(
+    db: Session,
+    todo_id: int,
+    values: dict[str, Any],
+    owner_id: int | None = None,
+    version: int | None = None,
+) -> db_models.Todo | None:
+    """Update a todo in one UPDATE ... RETURNING statement, bumping its version.
+
+    Ownership (if `owner_id` is given) and the expected `version` are enforced
+    in the WHERE clause. Returns None if no row matched.
+    """
+    if "completed" in values:
+        _move_completed_count(
+            db=db,
+            todo_id=todo_id,
+            completed=values["completed"],
+            owner_id=owner_id,
+            version=version,
+        )
+    statement = (
+        update(db_models.Todo)
+        .where(db_models.Todo.id == todo_id)
+        .values(**values, version=db_models.Todo.version + 1)
+        .returning(db_models.Todo)
+        .execution_options(populate_existing=True)
+    )
+    if owner_id is not None:
+        statement = statement.where(db_models.Todo.owner_id == owner_id)
+    if version is not None:
+        statement = statement.where(db_models.Todo.version == version)
+    return db.scalars(statement).one_or_none()
+
+
+def delete_todo(db: Session, todo_id: int, owner_id: int | None = None) -> int | None:
+    """Delete a todo in one DELETE ... RETURNING statement.
+
+    Ownership (if `owner_id` is given) is enforced in the WHERE clause. Returns
+    the deleted todo's owner id, or None if no row matched.
+    """
+    statement = (
+        delete(db_models.Todo)
+        .where(db_models.Todo.id == todo_id)
+        .returning(db_models.Todo.owner_id, db_models.Todo.completed)
+    )
+    if owner_id is not None:
+        statement = statement.where(db_models.Todo.owner_id == owner_id)
+    deleted = db.execute(statement).one_or_none()
+    if deleted is None:
+        return None
+    deleted_owner_id: int = deleted.owner_id
+    _adjust_count(
+        db=db, owner_id=deleted_owner_id, completed=deleted.completed, delta=-1
+    )
+    return deleted_owner_id
+
+
+def get_todo_owner_id(db: Session, todo_id: int) -> int | None:
+    """Get a todo's owner id, e.g. to tell a missing todo from one not owned."""
+    return db.scalar(
+        select(db_models.Todo.owner_id).where(db_models.Todo.id == todo_id)
+    )
+
+
+def reconcile_todo_counts(db: Session, user_id: int | None = None) -> int:
+    """Recount open/done todos for one user (or all), repairing any drift.
+
+    Returns the number of users updated.
+    """
+
+    def count(completed: bool):
+        return (
+            select(func.count(db_models.Todo.id))
+            .where(
+                db_models.Todo.owner_id == db_models.User.id,
+                db_models.Todo.completed == completed,
+            )
+            .scalar_subquery()
+        )
+
+    archived_count = (
+        select(func.count(db_models.ArchivedTodo.id))
+        .where(db_models.ArchivedTodo.owner_id == db_models.User.id)
+        .scalar_subquery()
+    )
+    statement = (
+        update(db_models.User)
+        .values(open_count=count(False), done_count=count(True) + archived_count)
+        .execution_options(synchronize_session=False)
+    )
+    if user_id is not None:
+        statement = statement.where(db_models.User.id == user_id)
+    return cast(CursorResult, db.execute(statement)).rowcount
+
+
+# ------------ Counters ------------
+def _adjust_count(db: Session, owner_id: int, completed: bool, delta: int) -> None:
+    """Add `delta` to the owner's done (or open) todo count."""
+    column = db_models.User.done_count if completed else db_models.User.open_count
+    db.execute(
+        update(db_models.User)
+        .where(db_models.User.id == owner_id)
+        .values({column: column + delta})
+    )
+
+
+def _move_completed_count(
+    db: Session,
+    todo_id: int,
+    completed: bool,
+    owner_id: int | None,
+    version: int | None,
+) -> None:
+    """Move one count between open and done, if the update flips the todo.
+
+    Runs just before the todo's UPDATE, with the same conditions, while the old
+    completed value can still be seen.
+    """
+    flipped_todo_owner = select(db_models.Todo.owner_id).where(
+        db_models.Todo.id == todo_id, db_models.Todo.completed != completed
+    )
+    if owner_id is not None:
+        flipped_todo_owner = flipped_todo_owner.where(
+            db_models.Todo.owner_id == owner_id
+        )
+    if version is not None:
+        flipped_todo_owner = flipped_todo_owner.where(
+            db_models.Todo.version == version
+        )
+    delta = 1 if completed else -1
+    db.execute(
+        update(db_models.User)
+        .where(db_models.User.id == flipped_todo_owner.scalar_subquery())
+        .values(
+            open_count=db_models.User.open_count - delta,
+            done_count=db_models.User.done_count + delta,
+        )
+    )
+
+
+# ------------ Jobs ------------
+@job_runner.register(EXPORT_TODOS_JOB)
+def export_todos_job(payload: dict[str, Any]) -> dict[str, Any]:
+    """Export all of an owner's todos, and optionally their archived todos."""
+    with SessionLocal() as db:
+        rows = get_todo_rows(
+            db=db,
+            owner_id=payload["owner_id"],
+            include_archived=payload.get("include_archived", False),
+        )
+    return {"todos": [row._asdict() for row in rows]}
+
+
+@job_runner.register(RECONCILE_COUNTS_JOB)
+def reconcile_todo_counts_job(payload: dict[str, Any]) -> dict[str, Any]:
+    with SessionLocal.begin() as db:
+        users_updated = reconcile_todo_counts(db=db, user_id=payload.get("user_id"))
+    return {"users_updated": users_updated}
@@ -1,2 +1,99 @@
+from collections.abc import Sequence
+from typing import Any
+
+from sqlalchemy import CursorResult, Row, delete, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.datastore import db_models
+from app.datastore.database import SessionLocal
+from app.services.jobs import job_runner
+
+PURGE_BATCH_SIZE = 10_000
+PURGE_USER_JOB = "purge_user"
+
+
 def add_user():
     """Add a new user to the database."""
+
+
+def get_user_rows(
+    db: Session, fields: Sequence[str], user_id: int | None = None
+) -> list[Row]:
+    """Get users' `fields` and version (one user's, if `user_id`) as plain rows."""
+    query = select(
+        *(getattr(db_models.User, name) for name in fields), db_models.User.version
+    )
+    if user_id is not None:
+        query = query.where(db_models.User.id == user_id)
+    return list(db.execute(query).all())
+
+
+def update_user(
+    db: Session, user_id: int, values: dict[str, Any], version: int | None = None
+) -> db_models.User | None:
+    """Update a user in one UPDATE ... RETURNING statement, bumping its version.
+
+    The expected `version` is enforced in the WHERE clause. Returns None if no
+    row matched.
+    """
+    statement = (
+        update(db_models.User)
+        .where(db_models.User.id == user_id)
+        .values(**values, version=db_models.User.version + 1)
+        .returning(db_models.User)
+        .execution_options(populate_existing=True)
+    )
+    if version is not None:
+        statement = statement.where(db_models.User.version == version)
+    return db.scalars(statement).one_or_none()
+
+
+def delete_user(db: Session, user_id: int) -> bool:
+    """Delete a user in one statement; the database cascades to their todos.
+
+    Returns whether the user existed.
+    """
+    statement = (
+        delete(db_models.User)
+        .where(db_models.User.id == user_id)
+        .returning(db_models.User.id)
+        .execution_options(synchronize_session=False)
+    )
+    return db.scalar(statement) is not None
+
+
+def purge_user(
+    user_id: int,
+    session_factory: sessionmaker = SessionLocal,
+    batch_size: int = PURGE_BATCH_SIZE,
+) -> int:
+    """Delete a user's todos in batches, then the user.
+
+    Each batch is its own short transaction, so purging a very large account
+    doesn't hold one long write lock. Returns the number of todos deleted.
+    """
+    deleted = 0
+    batch_ids = (
+        select(db_models.Todo.id)
+        .where(db_models.Todo.owner_id == user_id)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    while True:
+        with session_factory.begin() as db:
+            result: CursorResult = db.execute(
+                delete(db_models.Todo)
+                .where(db_models.Todo.id.in_(batch_ids))
+                .execution_options(synchronize_session=False)
+            )
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    with session_factory.begin() as db:
+        delete_user(db=db, user_id=user_id)
+    return deleted
+
+
+@job_runner.register(PURGE_USER_JOB)
+def purge_user_job(payload: dict[str, Any]) -> dict[str, Any]:
+    return {"todos_deleted": purge_user(user_id=payload["user_id"])}
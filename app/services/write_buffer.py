@@ -0,0 +1,167 @@
+"""Coalescing write buffer for rapid todo edits.
+
+Edits from the HTML todo list (title typing, checkbox toggles) arrive as a
+burst of small patches to the same row. Rather than writing each one, patches
+are merged per todo and written together once the buffer's delay has passed,
+in a single transaction, in a worker thread. Values that fail to write stay
+pending, and the flush is retried.
+
+Pending values are visible to readers that ask for them, or that flush the
+reader's own todos first (read-your-writes), and anything that writes a todo outside the buffer should flush or discard
+that todo first. The buffer is per process, so it assumes a user's requests
+are served by the same worker; a flush on shutdown keeps edits from being lost.
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy.orm import sessionmaker
+
+from app.datastore.database import SessionLocal
+from app.services import todos
+
+logger = logging.getLogger(__name__)
+
+FLUSH_DELAY = 0.5  # seconds
+FLUSH_RETRY_DELAY = 5.0  # seconds, after a failed flush
+
+
+@dataclass
+class PendingWrite:
+    """Merged, not yet written, field values for one todo."""
+
+    owner_id: int
+    values: dict[str, Any] = field(default_factory=dict)
+
+
+class TodoWriteBuffer:
+    """Merge consecutive updates to the same todo and write them once."""
+
+    def __init__(
+        self, session_factory: sessionmaker = SessionLocal, delay: float = FLUSH_DELAY
+    ):
+        self.session_factory = session_factory
+        self.delay = delay
+        self._pending: dict[int, PendingWrite] = {}
+        # Timed flushes write in a worker thread
+        self._lock = threading.Lock()
+        # Held while writing, so an older write never lands after a newer one
+        self._write_lock = threading.Lock()
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_tasks: set[asyncio.Task] = set()
+
+    def write(self, todo_id: int, owner_id: int, values: dict[str, Any]) -> None:
+        """Buffer `values` for the todo, merging with any pending values."""
+        with self._lock:
+            pending = self._pending.get(todo_id)
+            if pending is None or pending.owner_id != owner_id:
+                pending = self._pending[todo_id] = PendingWrite(owner_id=owner_id)
+            pending.values.update(values)
+        self._schedule_flush(self.delay)
+
+    def track(self, todo_id: int, owner_id: int) -> None:
+        """Record an ownership-checked todo that was just written directly.
+
+        Further edits to it before the next flush are buffered without
+        re-checking ownership.
+        """
+        self.write(todo_id=todo_id, owner_id=owner_id, values={})
+
+    def pending_owner(self, todo_id: int) -> int | None:
+        """The owner of the todo, if it has pending writes (already checked)."""
+        pending = self._pending.get(todo_id)
+        return pending.owner_id if pending else None
+
+    def pending_values(self, todo_id: int) -> dict[str, Any]:
+        """Field values written for the todo, but not yet flushed."""
+        with self._lock:
+            pending = self._pending.get(todo_id)
+            return dict(pending.values) if pending else {}
+
+    def discard(self, todo_id: int) -> None:
+        """Drop pending writes, e.g. because the todo is being deleted."""
+        with self._lock:
+            self._pending.pop(todo_id, None)
+
+    def flush_todo(self, todo_id: int) -> None:
+        """Write the todo's pending values now, if it has any."""
+        if todo_id in self._pending and not self._write([todo_id]):
+            self._schedule_flush(FLUSH_RETRY_DELAY)
+
+    async def flush_owner(self, owner_id: int | None) -> None:
+        """Write the owner's pending values (everyone's if None) in a worker thread.
+
+        Lets a read see the reader's own edits, without paying for everyone's.
+        """
+        with self._lock:
+            todo_ids = [
+                todo_id
+                for todo_id, pending in self._pending.items()
+                if owner_id is None or pending.owner_id == owner_id
+            ]
+        if todo_ids and not await asyncio.to_thread(self._write, todo_ids):
+            self._schedule_flush(FLUSH_RETRY_DELAY)
+
+    def flush(self) -> None:
+        """Write all pending values now, in one transaction."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending and not self._write():
+            self._schedule_flush(FLUSH_RETRY_DELAY)
+
+    def _schedule_flush(self, delay: float) -> None:
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        """Flush in a worker thread, so the event loop isn't blocked."""
+        self._flush_handle = None
+        task = asyncio.create_task(self._flush_in_thread())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_in_thread(self) -> None:
+        if not await asyncio.to_thread(self._write):
+            self._schedule_flush(FLUSH_RETRY_DELAY)
+
+    def _write(self, todo_ids: list[int] | None = None) -> bool:
+        """Write the pending values of `todo_ids` (all if None), in one transaction.
+
+        Written todos are no longer pending, unless edited again meanwhile. If
+        the write fails their values stay pending, to be retried. Returns
+        whether the write succeeded.
+        """
+        with self._write_lock:
+            with self._lock:
+                batch = {
+                    todo_id: (pending, dict(pending.values))
+                    for todo_id, pending in self._pending.items()
+                    if todo_ids is None or todo_id in todo_ids
+                }
+            try:
+                with self.session_factory.begin() as db:
+                    for todo_id, (pending, values) in batch.items():
+                        if not values:
+                            continue
+                        todos.update_todo(
+                            db=db,
+                            todo_id=todo_id,
+                            values=values,
+                            owner_id=pending.owner_id,
+                        )
+            except Exception:
+                logger.exception("Failed to flush %s buffered todo writes", len(batch))
+                return False
+            with self._lock:
+                for todo_id, (pending, values) in batch.items():
+                    edited = pending.values != values  # while it was being written
+                    if self._pending.get(todo_id) is pending and not edited:
+                        del self._pending[todo_id]
+            return True
+
+
+todo_write_buffer = TodoWriteBuffer()
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Any, Literal
+
 from pydantic import BaseModel, EmailStr, Field
 
 from app.web import field_types as ft
@@ -33,6 +36,11 @@ class UserOutLimited(BaseModel):
     is_active: bool = False
 
 
+class UserStatsOut(BaseModel):
+    open_count: int
+    done_count: int
+
+
 # ----------- Todo Models -----------
 class TodoInPost(BaseModel):
     title: ft.Min3Field
@@ -56,6 +64,58 @@ class TodoOutLimited(BaseModel):
     completed: bool
 
 
+class TodoChangesOut(BaseModel):
+    upserted: list[TodoOutLimited]
+    deleted: list[int]
+    token: str
+
+
+class TodoSearchOut(BaseModel):
+    todos: list[TodoOutLimited]
+    next_offset: int | None = None
+
+
+# ----------- Job Models -----------
+class JobOut(BaseModel):
+    id: str
+    kind: str
+    status: str
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+# ----------- Batch Models -----------
+MAX_BATCH_OPERATIONS = 100
+
+
+class BatchOperationIn(BaseModel):
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"]
+    path: str = Field(pattern=r"^/", examples=["/todos/1?fields=title"])
+    body: Any = None
+    headers: dict[str, str] = Field(default_factory=dict)
+
+
+class BatchIn(BaseModel):
+    operations: list[BatchOperationIn] = Field(
+        min_length=1, max_length=MAX_BATCH_OPERATIONS
+    )
+    atomic: bool = False
+
+
+class BatchResultOut(BaseModel):
+    status: int
+    headers: dict[str, str] = Field(default_factory=dict)
+    body: Any = None
+
+
+class BatchOut(BaseModel):
+    results: list[BatchResultOut]
+    rolled_back: bool = False
+
+
 # ----------- Full Models -----------
 class TodoOutFull(TodoOutLimited):
     owner: UserOutLimited
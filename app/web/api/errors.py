@@ -13,6 +13,51 @@ UserPermissionsError = HTTPException(
     status_code=status.HTTP_403_FORBIDDEN,
     detail="User does not have permission to perform this action",
 )
+UserVersionMismatchError = HTTPException(
+    status_code=status.HTTP_412_PRECONDITION_FAILED,
+    detail="User was modified since it was fetched",
+)
 
 # ----------- Todo Errors -----------
 TodoNotFoundError = HTTPException(status_code=404, detail="Todo not found")
+TodoVersionMismatchError = HTTPException(
+    status_code=status.HTTP_412_PRECONDITION_FAILED,
+    detail="Todo was modified since it was fetched",
+)
+InvalidSyncTokenError = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token"
+)
+SyncTokenExpiredError = HTTPException(
+    status_code=status.HTTP_410_GONE,
+    detail="Sync token expired, fetch the full todo list again",
+)
+
+# ----------- Job Errors -----------
+JobNotFoundError = HTTPException(status_code=404, detail="Job not found")
+
+# ----------- Batch Errors -----------
+BatchNestedError = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST, detail="Batches can't be nested"
+)
+
+# ----------- Idempotency Errors -----------
+IdempotencyKeyInvalidError = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Idempotency-Key must be at most 255 characters",
+)
+IdempotencyKeyInProgressError = HTTPException(
+    status_code=status.HTTP_409_CONFLICT,
+    detail="A request with this Idempotency-Key is still in progress",
+)
+IdempotencyKeyReusedError = HTTPException(
+    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    detail="Idempotency-Key was already used for a different request",
+)
+
+# ----------- Fieldset Errors -----------
+InvalidFieldsError = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown field requested"
+)
+InvalidIncludeError = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown relation to include"
+)
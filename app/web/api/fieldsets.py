@@ -0,0 +1,78 @@
+"""Sparse fieldsets for the API: `fields=` and `include=` query parameters.
+
+`fields` is a comma-separated list of the columns to return (`id` is always
+returned), `include` the relations to embed, and `fields[<relation>]` the
+columns of an included relation. Routes select just those columns, and only
+query the relations that were included, so a client that needs ids and titles
+doesn't pay for descriptions, owners or whole todo lists. Included collections
+are paginated.
+
+Without any of these parameters a route returns its full model, as before.
+"""
+from collections.abc import Sequence
+from typing import Annotated, Any
+
+from fastapi import Query
+from sqlalchemy import RowMapping
+
+from app.web.api import api_models, errors
+
+# ----------- Fields -----------
+TODO_FIELDS = tuple(api_models.TodoOutLimited.model_fields)
+USER_FIELDS = tuple(api_models.UserOutLimited.model_fields)
+TODO_INCLUDES = ("owner",)
+USER_INCLUDES = ("todos",)
+
+# ----------- Query parameters -----------
+FieldsQuery = Annotated[
+    str | None, Query(description="Comma-separated fields to return.")
+]
+IncludeQuery = Annotated[
+    str | None, Query(description="Comma-separated relations to embed.")
+]
+OwnerFieldsQuery = Annotated[
+    str | None,
+    Query(alias="fields[owner]", description="Owner fields, with include=owner."),
+]
+TodosFieldsQuery = Annotated[
+    str | None,
+    Query(alias="fields[todos]", description="Todo fields, with include=todos."),
+]
+TodosLimitQuery = Annotated[int, Query(ge=1, le=100)]
+TodosOffsetQuery = Annotated[int, Query(ge=0)]
+
+
+def is_sparse(*params: str | None) -> bool:
+    """Whether any sparse fieldset parameter was given."""
+    return any(param is not None for param in params)
+
+
+def parse_fields(value: str | None, allowed: Sequence[str]) -> tuple[str, ...]:
+    """Requested fields, in `allowed` order and always with `id`; all if None."""
+    if value is None:
+        return tuple(allowed)
+    requested = _split(value)
+    if not requested <= set(allowed):
+        raise errors.InvalidFieldsError
+    return tuple(name for name in allowed if name == "id" or name in requested)
+
+
+def parse_include(value: str | None, allowed: Sequence[str]) -> frozenset[str]:
+    """Requested relations to embed; none if None."""
+    if value is None:
+        return frozenset()
+    requested = _split(value)
+    if not requested <= set(allowed):
+        raise errors.InvalidIncludeError
+    return requested
+
+
+def pick(
+    mapping: RowMapping, fields: Sequence[str], prefix: str = ""
+) -> dict[str, Any]:
+    """Take `fields` from a row's mapping, whose keys may carry a `prefix`."""
+    return {name: mapping[prefix + name] for name in fields}
+
+
+def _split(value: str) -> frozenset[str]:
+    return frozenset(name.strip() for name in value.split(",") if name.strip())
@@ -0,0 +1,181 @@
+"""Idempotency-Key support for API POSTs.
+
+A client that may retry a POST (e.g. creating a todo, after a timeout) sends
+an `Idempotency-Key` header with a unique value, and the same key on every
+retry. The first request runs and its response is stored (see
+`services.idempotency`); a retry gets the stored response back, with an
+`Idempotent-Replayed: true` header, without running again. So a retried
+create doesn't create a duplicate.
+
+Keys are scoped to the user of the bearer token, and to the method and path.
+A retry while the first request is still running gets 409, and reusing a key
+for a different body gets 422. Anonymous requests (e.g. signing up) are also
+scoped to their body, so a key only replays to a request identical to the
+first one, and never to another client's different request. Server errors
+(5xx) aren't stored, so they can be retried.
+
+The operations of a batch (`/api/batch`) are left alone: an atomic batch can
+roll them back after they've responded, so their responses can't be stored
+on their own. Send the key with the batch request instead.
+"""
+import hashlib
+
+import anyio
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.idempotency import IdempotencyStore, idempotency_store
+from app.web import auth
+from app.web import errors as web_errors
+from app.web.api import errors
+from app.web.api.routes.batch import OPERATION_SCOPE_KEY
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# Response headers that belong to one response only, and aren't replayed
+UNSTORED_HEADERS = frozenset({"date", "server-timing", "set-cookie"})
+
+
+class IdempotencyMiddleware:
+    """Replay the stored response of requests retried with an Idempotency-Key."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: IdempotencyStore = idempotency_store,
+        methods: tuple[str, ...] = ("POST",),
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.methods = methods
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or scope.get(OPERATION_SCOPE_KEY)
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        client_key = headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not client_key:
+            await self.app(scope, receive, send)
+            return
+        if len(client_key) > MAX_KEY_LENGTH:
+            await _error_response(errors.IdempotencyKeyInvalidError)(
+                scope, receive, send
+            )
+            return
+
+        request_messages = await _read_request(receive)
+        body = b"".join(message.get("body", b"") for message in request_messages)
+        request_hash = _hash(scope["query_string"], body)
+        principal = await _principal(headers) or f"anonymous:{request_hash}"
+        key = _hash(principal, scope["method"], scope["path"], client_key)
+
+        # The store's database calls run in the threadpool, off the event loop.
+        stored = await run_in_threadpool(
+            self.store.reserve, key=key, request_hash=request_hash
+        )
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                response = _error_response(errors.IdempotencyKeyReusedError)
+            elif stored.status_code is None:
+                response = _error_response(errors.IdempotencyKeyInProgressError)
+            else:
+                await _replay(send, stored.status_code, stored.headers, stored.body)
+                return
+            await response(scope, receive, send)
+            return
+
+        async def replay_receive() -> Message:
+            if request_messages:
+                return request_messages.pop(0)
+            return await receive()
+
+        response_start: Message = {}
+        response_body: list[bytes] = []
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_start
+            if message["type"] == "http.response.start":
+                response_start = message
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+        except BaseException:
+            with anyio.CancelScope(shield=True):  # release even if cancelled
+                await run_in_threadpool(self.store.release, key)
+            raise
+        if not response_start or response_start["status"] >= 500:
+            await run_in_threadpool(self.store.release, key)
+            return
+        await run_in_threadpool(
+            self.store.complete,
+            key=key,
+            request_hash=request_hash,
+            status_code=response_start["status"],
+            headers={
+                name.decode("latin-1"): value.decode("latin-1")
+                for name, value in response_start.get("headers", [])
+                if name.decode("latin-1").lower() not in UNSTORED_HEADERS
+            },
+            body=b"".join(response_body),
+        )
+        self.store.schedule_purge()
+
+
+async def _read_request(receive: Receive) -> list[Message]:
+    """Read the whole request body, as its messages."""
+    messages = []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request" or not message.get("more_body"):
+            return messages
+
+
+async def _principal(headers: Headers) -> str | None:
+    """Who keys belong to: the bearer token's user, or None if anonymous."""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = await auth.parse_access_token(access_token=token)
+    except web_errors.WebError:
+        return None
+    return f"user:{payload['user_id']}"
+
+
+async def _replay(
+    send: Send, status_code: int, headers: dict[str, str], body: bytes
+) -> None:
+    raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in headers.items()
+    ]
+    raw_headers.append((REPLAYED_HEADER.lower().encode("latin-1"), b"true"))
+    await send(
+        {"type": "http.response.start", "status": status_code, "headers": raw_headers}
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def _error_response(error: HTTPException) -> JSONResponse:
+    return JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+
+
+def _hash(*parts: str | bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode() if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
@@ -1,8 +1,10 @@
 from fastapi import FastAPI
 
-from app.web.api.routes import auth, todos, users
+from app.web.api.idempotency import IdempotencyMiddleware
+from app.web.api.routes import auth, batch, jobs, todos, users
 
 app = FastAPI()
+app.add_middleware(IdempotencyMiddleware)
 
-for route in (auth, users, todos):
+for route in (auth, users, todos, jobs, batch):
     app.include_router(route.router)
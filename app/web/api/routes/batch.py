@@ -0,0 +1,161 @@
+import json
+import logging
+from typing import Any
+
+from fastapi import APIRouter, Request, status
+from starlette.types import Message, Scope
+
+from app.datastore.database import shared_session
+from app.services import broadcast
+from app.web import auth
+from app.web.api import api_models, errors
+
+logger = logging.getLogger(__name__)
+
+# ----------- Routers -----------
+router = APIRouter(tags=["batch"], prefix="/batch")
+
+# Headers of the batch request passed on to each operation
+FORWARDED_HEADERS = ("authorization", "accept", broadcast.CLIENT_ID_HEADER.lower())
+# Set in the scope of each operation, for middleware to tell them apart
+OPERATION_SCOPE_KEY = "batch.operation"
+
+
+class _Abort(Exception):
+    """Raised to roll back an atomic batch."""
+
+
+# ----------- Batch routes -----------
+@router.post("", status_code=status.HTTP_200_OK, response_model=api_models.BatchOut)
+async def run_batch(
+    access_token: auth.TokenDependency,
+    batch_in: api_models.BatchIn,
+    request: Request,
+) -> api_models.BatchOut:
+    """Run API requests in order, in one round trip, and return their responses.
+
+    Paths are relative to the API, e.g. `/todos/1`. The batch is authenticated
+    once, and its operations share one database session. Each operation
+    commits on its own, unless `atomic`: then they're one transaction, the
+    batch stops at the first failed operation and everything is rolled back
+    (the operations that didn't run get 424). Effects outside the database,
+    such as change events, aren't rolled back.
+    """
+    paths = (_path(operation) for operation in batch_in.operations)
+    if any(path.startswith(router.prefix) for path in paths):
+        raise errors.BatchNestedError
+    results: list[api_models.BatchResultOut] = []
+    try:
+        with shared_session(atomic=batch_in.atomic) as db:
+            payload = await auth.parse_access_token(access_token=access_token)
+            user_id = int(payload["user_id"])  # type: ignore[arg-type]
+            user = auth.get_current_user_by_id(user_id, db)
+            with auth.reuse_authentication(access_token=access_token, user=user):
+                for operation in batch_in.operations:
+                    result = await _dispatch(request=request, operation=operation)
+                    results.append(result)
+                    if batch_in.atomic and result.status >= 400:
+                        raise _Abort
+    except _Abort:
+        skipped = api_models.BatchResultOut(status=status.HTTP_424_FAILED_DEPENDENCY)
+        results += [skipped] * (len(batch_in.operations) - len(results))
+        return api_models.BatchOut(results=results, rolled_back=True)
+    return api_models.BatchOut(results=results)
+
+
+# ----------- Helper functions -----------
+async def _dispatch(
+    request: Request, operation: api_models.BatchOperationIn
+) -> api_models.BatchResultOut:
+    """Run one operation through the API app, in-process."""
+    body = b"" if operation.body is None else json.dumps(operation.body).encode()
+    headers = {
+        name: value
+        for name, value in request.headers.items()
+        if name in FORWARDED_HEADERS
+    }
+    headers.update({name.lower(): value for name, value in operation.headers.items()})
+    if body:
+        headers["content-type"] = "application/json"
+        headers["content-length"] = str(len(body))
+    scope = _scope(request=request, operation=operation, headers=headers)
+
+    request_messages = [{"type": "http.request", "body": body, "more_body": False}]
+    response_start: Message = {}
+    response_body: list[bytes] = []
+
+    async def receive() -> Message:
+        if request_messages:
+            return request_messages.pop()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        nonlocal response_start
+        if message["type"] == "http.response.start":
+            response_start = message
+        elif message["type"] == "http.response.body":
+            response_body.append(message.get("body", b""))
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception:
+        # The app has sent its 500 response (if it got that far) and re-raised.
+        logger.exception(
+            "Batch operation %s %s failed", operation.method, operation.path
+        )
+        if not response_start:
+            return api_models.BatchResultOut(
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    response_headers = {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in response_start.get("headers", [])
+    }
+    return api_models.BatchResultOut(
+        status=response_start["status"],
+        headers=response_headers,
+        body=_decode_body(b"".join(response_body), response_headers),
+    )
+
+
+def _scope(
+    request: Request, operation: api_models.BatchOperationIn, headers: dict[str, str]
+) -> Scope:
+    """The ASGI scope of an operation, as if it had been requested directly."""
+    root_path = request.scope.get("root_path", "")
+    path = root_path + _path(operation)
+    scope: Scope = {
+        "type": "http",
+        # Optional keys, that some servers (and the TestClient) leave out
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": operation.method,
+        "scheme": request.url.scheme,
+        "server": request.scope.get("server"),
+        "client": request.scope.get("client"),
+        "root_path": root_path,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": operation.path.partition("?")[2].encode(),
+        "headers": [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in headers.items()
+        ],
+        "extensions": {},
+        OPERATION_SCOPE_KEY: True,
+    }
+    if "state" in request.scope:
+        scope["state"] = request.scope["state"].copy()
+    return scope
+
+
+def _path(operation: api_models.BatchOperationIn) -> str:
+    return operation.path.partition("?")[0]
+
+
+def _decode_body(body: bytes, headers: dict[str, str]) -> Any:
+    if not body:
+        return None
+    if headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body)
+    return body.decode("utf-8", errors="replace")
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.datastore import db_models
+from app.datastore.database import DBDependency
+from app.services import jobs
+from app.web import auth
+from app.web.api import api_models, errors
+
+# ----------- Routers -----------
+router = APIRouter(tags=["jobs"], prefix="/jobs")
+
+
+# ----------- Job routes -----------
+@router.get(
+    "/{job_id}", status_code=status.HTTP_200_OK, response_model=api_models.JobOut
+)
+async def get_job(
+    current_user: auth.TokenRequiredUser, job_id: str, db: DBDependency
+) -> db_models.Job:
+    """Get a background job's status, and its result once it has finished."""
+    job = jobs.get_job(db=db, job_id=job_id)
+    if job is None or not (current_user.is_admin() or job.owner_id == current_user.id):
+        raise errors.JobNotFoundError
+    return job
+
+
+# ----------- Helper functions -----------
+def accepted_response(request: Request, job: db_models.Job) -> JSONResponse:
+    """202 response for a submitted job, pointing at its status endpoint."""
+    job_out = api_models.JobOut.model_validate(job, from_attributes=True)
+    # Resolved on the API app itself (the root app only knows "api:get_job",
+    # batch sub-requests only the API app), then prefixed with its mount path
+    path = request.scope.get("root_path", "") + request.app.url_path_for(
+        "get_job", job_id=job.id
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=jsonable_encoder(job_out),
+        headers={"Location": str(request.base_url.replace(path=path))},
+    )
@@ -1,38 +1,200 @@
-from typing import cast
+import json
+from collections.abc import AsyncIterator
+from typing import Annotated
 
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Header, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter
 
 from app.datastore import db_models as db_models
 from app.datastore.database import DBDependency, Session
-from app.web import auth
+from app.services import broadcast, todo_archive, todo_search, todo_sync, todos
+from app.services.broadcast import todo_hub
+from app.services.jobs import job_runner
+from app.services.write_buffer import todo_write_buffer
+from app.web import auth, etags
 from app.web import field_types as ft
-from app.web.api import api_models, errors
+from app.web.api import api_models, errors, fieldsets, responses
+from app.web.api.routes.jobs import accepted_response
 
 router = APIRouter(tags=["todos"], prefix="/todos")
 
+# Serializers for the fast (validate once, dump in pydantic-core) path
+TODO_LIST = TypeAdapter(list[api_models.TodoOutLimited])
+TODO_CHANGES = TypeAdapter(api_models.TodoChangesOut)
+TODO_SEARCH = TypeAdapter(api_models.TodoSearchOut)
+
+ClientIdHeader = Annotated[
+    str | None, Header(alias=broadcast.CLIENT_ID_HEADER, include_in_schema=False)
+]
+
 
 # ----------- Todo routes -----------
 @router.get(
     "", response_model=list[api_models.TodoOutLimited], status_code=status.HTTP_200_OK
 )
 async def get_todos(
-    current_user: auth.TokenRequiredUser, db: DBDependency
-) -> list[db_models.Todo]:
-    """Get todos, filtering on the desired fields."""
-    query = db.query(db_models.Todo)
+    current_user: auth.TokenRequiredUser,
+    db: DBDependency,
+    include_archived: bool = False,
+    fields: fieldsets.FieldsQuery = None,
+) -> Response:
+    """Get todos, filtering on the desired fields.
+
+    Archived todos are only included (after the others) if asked for. With
+    `fields`, only those fields are selected and returned.
+    """
+    await todo_write_buffer.flush_owner(_owner_filter(current_user))
+    rows = todos.get_todo_rows(
+        db=db,
+        owner_id=_owner_filter(current_user),
+        include_archived=include_archived,
+        fields=fieldsets.parse_fields(fields, fieldsets.TODO_FIELDS),
+    )
+    if fields is not None:
+        return responses.FastJSONResponse([row._asdict() for row in rows])
+    return responses.model_response(TODO_LIST, rows)
+
+
+@router.get(
+    "/changes",
+    response_model=api_models.TodoChangesOut,
+    status_code=status.HTTP_200_OK,
+)
+async def get_todo_changes(
+    current_user: auth.TokenRequiredUser, db: DBDependency, since: str | None = None
+) -> Response:
+    """Get the todos changed, and ids of todos deleted, since a sync token.
+
+    Omit `since` for a full sync. Pass the returned token on the next sync.
+    """
+    await todo_write_buffer.flush_owner(current_user.id)
+    try:
+        changes = todo_sync.get_changes(db=db, owner_id=current_user.id, since=since)
+    except todo_sync.InvalidSyncTokenError as e:
+        raise errors.InvalidSyncTokenError from e
+    except todo_sync.SyncTokenExpiredError as e:
+        raise errors.SyncTokenExpiredError from e
+    return responses.model_response(TODO_CHANGES, changes)
+
+
+@router.get(
+    "/search",
+    response_model=api_models.TodoSearchOut,
+    status_code=status.HTTP_200_OK,
+)
+async def search_todos(
+    current_user: auth.TokenRequiredUser,
+    db: DBDependency,
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0,
+) -> Response:
+    """Full-text search the user's todo titles and descriptions, best match first.
+
+    Each word matches as a prefix. Pass `next_offset` back as `offset` for the
+    next page.
+    """
+    await todo_write_buffer.flush_owner(current_user.id)
+    page = todo_search.search_todos(
+        db=db, owner_id=current_user.id, query=q, limit=limit, offset=offset
+    )
+    return responses.model_response(TODO_SEARCH, page)
+
+
+@router.post("/export", status_code=status.HTTP_202_ACCEPTED)
+async def export_todos(
+    current_user: auth.TokenRequiredUser,
+    request: Request,
+    include_archived: bool = False,
+) -> JSONResponse:
+    """Export all of the user's todos in a background job.
+
+    Poll the job (see the Location header) for the exported todos.
+    """
+    await todo_write_buffer.flush_owner(current_user.id)
+    job = job_runner.submit(
+        todos.EXPORT_TODOS_JOB,
+        {"owner_id": current_user.id, "include_archived": include_archived},
+        owner_id=current_user.id,
+    )
+    return accepted_response(request=request, job=job)
+
+
+@router.post("/archive", status_code=status.HTTP_202_ACCEPTED)
+async def archive_todos(
+    current_user: auth.TokenRequiredUser,
+    request: Request,
+    older_than_days: Annotated[int | None, Query(ge=0)] = None,
+) -> JSONResponse:
+    """Archive old completed todos in a background job (admin only).
+
+    Defaults to the archival policy's age if `older_than_days` isn't given.
+    """
     if not current_user.is_admin():
-        query = query.filter(db_models.Todo.owner_id == current_user.id)
-    return cast(list[db_models.Todo], query.all())
+        raise errors.UserPermissionsError
+    # The job archives everyone's todos
+    await todo_write_buffer.flush_owner(None)
+    payload = {} if older_than_days is None else {"older_than_days": older_than_days}
+    job = job_runner.submit(
+        todo_archive.ARCHIVE_TODOS_JOB, payload, owner_id=current_user.id
+    )
+    return accepted_response(request=request, job=job)
+
+
+@router.get("/events", response_class=StreamingResponse)
+async def todo_events(
+    user_id: auth.TokenRequiredUserId, client_id: ClientIdHeader = None
+) -> StreamingResponse:
+    """Stream the user's todo changes as JSON Server-Sent Events.
+
+    Changes made with the same X-Client-Id header aren't sent back.
+    """
+
+    async def stream() -> AsyncIterator[str]:
+        async for event in todo_hub.listen(user_id=user_id, client_id=client_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = {"action": event.action, "id": event.todo_id, **event.fields}
+            yield broadcast.format_sse("todo", json.dumps(data))
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get(
     "/{todo_id}", status_code=status.HTTP_200_OK, response_model=api_models.TodoOutFull
 )
 async def get_todo(
-    current_user: auth.TokenRequiredUser, todo_id: ft.Id, db: DBDependency
-) -> db_models.Todo:
-    """Get a todo by id."""
-    return _get_todo_by_id(current_user=current_user, todo_id=todo_id, db=db)
+    current_user: auth.TokenRequiredUser,
+    todo_id: ft.Id,
+    db: DBDependency,
+    response: Response,
+    fields: fieldsets.FieldsQuery = None,
+    include: fieldsets.IncludeQuery = None,
+    owner_fields: fieldsets.OwnerFieldsQuery = None,
+) -> db_models.Todo | Response:
+    """Get a todo by id. The ETag header holds the todo's version.
+
+    With `fields`, `include` or `fields[owner]`, only those fields are
+    returned, and the owner is only embedded with `include=owner`.
+    """
+    if fieldsets.is_sparse(fields, include, owner_fields):
+        return _get_sparse_todo(
+            current_user=current_user,
+            todo_id=todo_id,
+            db=db,
+            fields=fields,
+            include=include,
+            owner_fields=owner_fields,
+        )
+    todo_model = _get_todo_by_id(current_user=current_user, todo_id=todo_id, db=db)
+    response.headers["ETag"] = etags.make_etag(todo_model.version)
+    return todo_model
 
 
 @router.post(
@@ -42,18 +204,27 @@ async def create_todo(
     current_user: auth.TokenRequiredUser,
     todo_in: api_models.TodoInPost,
     db: DBDependency,
+    client_id: ClientIdHeader = None,
 ) -> db_models.Todo:
     """Create a todo."""
-    todo_model = db_models.Todo(
+    todo_model = todos.create_todo(
+        db=db,
+        owner_id=current_user.id,
         title=todo_in.title,
         description=todo_in.description,
         priority=todo_in.priority,
         completed=todo_in.completed,
-        owner_id=current_user.id,
     )
-    db.add(todo_model)
     db.commit()
-    db.refresh(todo_model)
+    todo_hub.publish(
+        broadcast.TodoEvent(
+            action=broadcast.CREATE,
+            todo_id=todo_model.id,
+            owner_id=todo_model.owner_id,
+            fields=broadcast.todo_fields(todo_model),
+            origin=client_id,
+        )
+    )
     return todo_model
 
 
@@ -65,34 +236,115 @@ async def update_todo(
     todo_id: ft.Id,
     todo_in: api_models.TodoInPatch,
     db: DBDependency,
+    response: Response,
+    if_match: etags.IfMatchHeader = None,
+    client_id: ClientIdHeader = None,
 ) -> db_models.Todo:
-    """Update a todo."""
-    todo_model = _get_todo_by_id(current_user=current_user, todo_id=todo_id, db=db)
-    for field, value in todo_in.model_dump(exclude_unset=True).items():
-        setattr(todo_model, field, value)
+    """Update a todo.
+
+    With an If-Match header, the update only applies if the todo's version
+    still matches; otherwise it fails with 412.
+    """
+    todo_write_buffer.flush_todo(todo_id)
+    todo_model = todos.update_todo(
+        db=db,
+        todo_id=todo_id,
+        values=todo_in.model_dump(exclude_unset=True),
+        owner_id=_owner_filter(current_user),
+        version=etags.parse_if_match(if_match),
+    )
+    if todo_model is None:
+        # Only a failed update pays for a second query, to pick the error.
+        _get_todo_by_id(current_user=current_user, todo_id=todo_id, db=db)
+        raise errors.TodoVersionMismatchError
     db.commit()
-    db.refresh(todo_model)
+    response.headers["ETag"] = etags.make_etag(todo_model.version)
+    todo_hub.publish(
+        broadcast.TodoEvent(
+            action=broadcast.UPDATE,
+            todo_id=todo_model.id,
+            owner_id=todo_model.owner_id,
+            fields=broadcast.todo_fields(todo_model),
+            origin=client_id,
+        )
+    )
     return todo_model
 
 
 @router.delete("/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete(
-    current_user: auth.TokenRequiredUser, todo_id: ft.Id, db: DBDependency
+    current_user: auth.TokenRequiredUser,
+    todo_id: ft.Id,
+    db: DBDependency,
+    client_id: ClientIdHeader = None,
 ) -> None:
     """Delete a todo."""
-    todo_model = _get_todo_by_id(current_user=current_user, todo_id=todo_id, db=db)
-    db.delete(todo_model)
+    owner_id = todos.delete_todo(
+        db=db, todo_id=todo_id, owner_id=_owner_filter(current_user)
+    )
+    if owner_id is None:
+        raise errors.TodoNotFoundError
+    todo_write_buffer.discard(todo_id)
+    todo_sync.record_deletion(db=db, todo_id=todo_id, owner_id=owner_id)
     db.commit()
+    todo_hub.publish(
+        broadcast.TodoEvent(
+            action=broadcast.DELETE,
+            todo_id=todo_id,
+            owner_id=owner_id,
+            origin=client_id,
+        )
+    )
 
 
 # ------------ Helpers ------------
+def _owner_filter(current_user: db_models.User) -> int | None:
+    """Owner id that mutations are restricted to (admins can change any todo)."""
+    return None if current_user.is_admin() else current_user.id
+
+
 def _get_todo_by_id(
     current_user: db_models.User, todo_id: ft.Id, db: Session
 ) -> db_models.Todo:
-    """Get a todo by id."""
+    """Get a todo by id, writing any buffered edits to it first."""
+    todo_write_buffer.flush_todo(todo_id)
     query = db.query(db_models.Todo).filter(db_models.Todo.id == todo_id)
     if not current_user.is_admin():
         query = query.filter(db_models.Todo.owner_id == current_user.id)
     if todo_model := query.first():
         return todo_model
     raise errors.TodoNotFoundError
+
+
+def _get_sparse_todo(
+    current_user: db_models.User,
+    todo_id: ft.Id,
+    db: Session,
+    fields: str | None,
+    include: str | None,
+    owner_fields: str | None,
+) -> Response:
+    """Get a todo's requested fields, joining the owner only if included."""
+    todo_fields = fieldsets.parse_fields(fields, fieldsets.TODO_FIELDS)
+    includes = fieldsets.parse_include(include, fieldsets.TODO_INCLUDES)
+    user_fields = (
+        fieldsets.parse_fields(owner_fields, fieldsets.USER_FIELDS)
+        if "owner" in includes
+        else None
+    )
+    todo_write_buffer.flush_todo(todo_id)
+    row = todos.get_todo_fields(
+        db=db,
+        todo_id=todo_id,
+        fields=todo_fields,
+        owner_fields=user_fields,
+        owner_id=_owner_filter(current_user),
+    )
+    if row is None:
+        raise errors.TodoNotFoundError
+    content = fieldsets.pick(row._mapping, todo_fields)
+    if user_fields is not None:
+        content["owner"] = fieldsets.pick(row._mapping, user_fields, prefix="owner.")
+    return responses.FastJSONResponse(
+        content, headers={"ETag": etags.make_etag(row.version)}
+    )
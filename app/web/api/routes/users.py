@@ -1,13 +1,17 @@
-from typing import cast
+from typing import Any, cast
 
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Request, Response, status
 
 from app.datastore import db_models
 from app.datastore.database import DBDependency, Session
 from app.permissions import Role
-from app.web import auth
+from app.services import todos, users
+from app.services.jobs import job_runner
+from app.services.write_buffer import todo_write_buffer
+from app.web import auth, etags
 from app.web import field_types as ft
-from app.web.api import api_models, errors
+from app.web.api import api_models, errors, fieldsets, responses
+from app.web.api.routes.jobs import accepted_response
 from app.web.web_models import UnauthenticatedUser
 
 # ----------- Routers -----------
@@ -19,9 +23,24 @@ router = APIRouter(tags=["users"], prefix="/users")
     "", response_model=list[api_models.UserOutLimited], status_code=status.HTTP_200_OK
 )
 async def get_users(
-    current_user: auth.TokenOptionalUser, db: DBDependency
-) -> list[db_models.User]:
-    """Get users, filtering on the desired fields."""
+    current_user: auth.TokenOptionalUser,
+    db: DBDependency,
+    fields: fieldsets.FieldsQuery = None,
+) -> list[db_models.User] | Response:
+    """Get users, filtering on the desired fields.
+
+    With `fields`, only those fields are selected and returned.
+    """
+    if fields is not None:
+        user_fields = fieldsets.parse_fields(fields, fieldsets.USER_FIELDS)
+        rows = users.get_user_rows(
+            db=db,
+            fields=user_fields,
+            user_id=None if current_user.is_admin() else current_user.id,
+        )
+        return responses.FastJSONResponse(
+            [fieldsets.pick(row._mapping, user_fields) for row in rows]
+        )
     query = db.query(db_models.User)
     if not current_user.is_admin():
         query = query.filter(db_models.User.id == current_user.id)
@@ -34,20 +53,91 @@ async def get_users(
     response_model=api_models.UserOutFull,
 )
 async def get_current_user(
-    current_user: auth.TokenOptionalUser
-) -> db_models.User | UnauthenticatedUser:
-    """Get the current user."""
+    current_user: auth.TokenOptionalUser,
+    db: DBDependency,
+    fields: fieldsets.FieldsQuery = None,
+    include: fieldsets.IncludeQuery = None,
+    todos_fields: fieldsets.TodosFieldsQuery = None,
+    todos_limit: fieldsets.TodosLimitQuery = 20,
+    todos_offset: fieldsets.TodosOffsetQuery = 0,
+) -> db_models.User | UnauthenticatedUser | Response:
+    """Get the current user.
+
+    Takes the same sparse fieldset parameters as getting a user by id.
+    """
+    if isinstance(current_user, db_models.User) and fieldsets.is_sparse(
+        fields, include, todos_fields
+    ):
+        return await _get_sparse_user(
+            current_user=current_user,
+            user_id=current_user.id,
+            db=db,
+            fields=fields,
+            include=include,
+            todos_fields=todos_fields,
+            todos_limit=todos_limit,
+            todos_offset=todos_offset,
+        )
     return current_user
 
 
+@router.get(
+    "/current-user/stats",
+    status_code=status.HTTP_200_OK,
+    response_model=api_models.UserStatsOut,
+)
+async def get_current_user_stats(
+    current_user: auth.TokenRequiredUser,
+) -> db_models.User:
+    """Get the current user's open and done todo counts."""
+    return current_user
+
+
+@router.post("/reconcile-counts", status_code=status.HTTP_202_ACCEPTED)
+async def reconcile_counts(
+    current_user: auth.TokenRequiredUser, request: Request
+) -> Response:
+    """Recount every user's open and done todos in a background job (admin only)."""
+    if not current_user.is_admin():
+        raise errors.UserPermissionsError
+    job = job_runner.submit(todos.RECONCILE_COUNTS_JOB, {}, owner_id=current_user.id)
+    return accepted_response(request=request, job=job)
+
+
 @router.get(
     "/{user_id}", status_code=status.HTTP_200_OK, response_model=api_models.UserOutFull
 )
 async def get_user(
-    current_user: auth.TokenRequiredUser, user_id: ft.Id, db: DBDependency
-) -> db_models.User:
-    """Get a user by id."""
-    return _get_user_by_id(current_user=current_user, user_id=user_id, db=db)
+    current_user: auth.TokenRequiredUser,
+    user_id: ft.Id,
+    db: DBDependency,
+    response: Response,
+    fields: fieldsets.FieldsQuery = None,
+    include: fieldsets.IncludeQuery = None,
+    todos_fields: fieldsets.TodosFieldsQuery = None,
+    todos_limit: fieldsets.TodosLimitQuery = 20,
+    todos_offset: fieldsets.TodosOffsetQuery = 0,
+) -> db_models.User | Response:
+    """Get a user by id. The ETag header holds the user's version.
+
+    With `fields`, `include` or `fields[todos]`, only those fields are
+    returned. Todos are only embedded with `include=todos`, a page at a time
+    (`todos_limit` and `todos_offset`), as `{"items": [...], "next_offset"}`.
+    """
+    if fieldsets.is_sparse(fields, include, todos_fields):
+        return await _get_sparse_user(
+            current_user=current_user,
+            user_id=user_id,
+            db=db,
+            fields=fields,
+            include=include,
+            todos_fields=todos_fields,
+            todos_limit=todos_limit,
+            todos_offset=todos_offset,
+        )
+    user_model = _get_user_by_id(current_user=current_user, user_id=user_id, db=db)
+    response.headers["ETag"] = etags.make_etag(user_model.version)
+    return user_model
 
 
 @router.post(
@@ -68,7 +158,6 @@ async def create_user(
     )
     db.add(user_model)
     db.commit()
-    db.refresh(user_model)
     return user_model
 
 
@@ -81,16 +170,18 @@ async def update_current_user(
     current_user: auth.TokenRequiredUser,
     user_in: api_models.UserInPatch,
     db: DBDependency,
+    response: Response,
+    if_match: etags.IfMatchHeader = None,
 ) -> db_models.User:
-    """Update the current user."""
-    for field, value in user_in.model_dump(exclude_unset=True).items():
-        if field == "password":
-            field = "hashed_password"
-            value = auth.hash_password(value)
-        setattr(current_user, field, value)
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    """Update the current user, if its version matches any If-Match header."""
+    return _update_user(
+        current_user=current_user,
+        user_id=current_user.id,
+        user_in=user_in,
+        db=db,
+        response=response,
+        if_match=if_match,
+    )
 
 
 @router.patch(
@@ -101,42 +192,127 @@ async def update_user(
     user_id: ft.Id,
     user_in: api_models.UserInPatch,
     db: DBDependency,
+    response: Response,
+    if_match: etags.IfMatchHeader = None,
 ) -> db_models.User:
-    """Update a user."""
-    user_model = _get_user_by_id(current_user=current_user, user_id=user_id, db=db)
-    for field, value in user_in.model_dump(exclude_unset=True).items():
-        if field == "password":
-            field = "hashed_password"
-            value = auth.hash_password(value)
-        setattr(user_model, field, value)
-    db.commit()
-    db.refresh(user_model)
-    return user_model
+    """Update a user, if its version matches any If-Match header."""
+    return _update_user(
+        current_user=current_user,
+        user_id=user_id,
+        user_in=user_in,
+        db=db,
+        response=response,
+        if_match=if_match,
+    )
 
 
-@router.delete("/current-user", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/current-user", status_code=status.HTTP_204_NO_CONTENT, response_model=None
+)
 async def delete_current_user(
-    current_user: auth.TokenRequiredUser, db: DBDependency
-) -> None:
-    """Delete a user."""
-    user_model = _get_user_by_id(
-        current_user=current_user, user_id=current_user.id, db=db
+    current_user: auth.TokenRequiredUser,
+    db: DBDependency,
+    request: Request,
+    background: bool = False,
+) -> Response | None:
+    """Delete the current user, and their todos.
+
+    With `background`, the user is deactivated now and their todos are purged
+    in batches by a background job, for very large accounts. The 202 response
+    describes the job.
+    """
+    return _delete_user(
+        current_user=current_user,
+        user_id=current_user.id,
+        db=db,
+        request=request,
+        background=background,
     )
-    db.delete(user_model)
-    db.commit()
 
 
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/{user_id}", status_code=status.HTTP_204_NO_CONTENT, response_model=None
+)
 async def delete(
-    current_user: auth.TokenRequiredUser, user_id: ft.Id, db: DBDependency
-) -> None:
-    """Delete a user."""
-    user_model = _get_user_by_id(current_user=current_user, user_id=user_id, db=db)
-    db.delete(user_model)
-    db.commit()
+    current_user: auth.TokenRequiredUser,
+    user_id: ft.Id,
+    db: DBDependency,
+    request: Request,
+    background: bool = False,
+) -> Response | None:
+    """Delete a user, and their todos.
+
+    With `background`, the user is deactivated now and their todos are purged
+    in batches by a background job, for very large accounts. The 202 response
+    describes the job.
+    """
+    return _delete_user(
+        current_user=current_user,
+        user_id=user_id,
+        db=db,
+        request=request,
+        background=background,
+    )
 
 
 # ----------- Helper functions -----------
+def _update_user(
+    current_user: db_models.User,
+    user_id: ft.Id,
+    user_in: api_models.UserInPatch,
+    db: Session,
+    response: Response,
+    if_match: str | None,
+) -> db_models.User:
+    """Update a user in one UPDATE ... RETURNING statement.
+
+    The version check (from If-Match) is part of the WHERE clause, so a lost
+    update fails with 412 instead of overwriting the other change.
+    """
+    values: dict[str, Any] = user_in.model_dump(exclude_unset=True)
+    if "password" in values:
+        values["hashed_password"] = auth.hash_password(values.pop("password"))
+    user_model = None
+    if current_user.is_admin() or user_id == current_user.id:
+        user_model = users.update_user(
+            db=db,
+            user_id=user_id,
+            values=values,
+            version=etags.parse_if_match(if_match),
+        )
+    if user_model is None:
+        # Only a failed update pays for a second query, to pick the error.
+        _get_user_by_id(current_user=current_user, user_id=user_id, db=db)
+        raise errors.UserVersionMismatchError
+    db.commit()
+    response.headers["ETag"] = etags.make_etag(user_model.version)
+    return user_model
+
+
+def _delete_user(
+    current_user: db_models.User,
+    user_id: ft.Id,
+    db: Session,
+    request: Request,
+    background: bool,
+) -> Response | None:
+    """Delete a user now, or deactivate them and purge them in a background job."""
+    if not (current_user.is_admin() or user_id == current_user.id):
+        raise errors.UserNotFoundError
+    if not background:
+        if not users.delete_user(db=db, user_id=user_id):
+            raise errors.UserNotFoundError
+        db.commit()
+        return None
+    if not users.update_user(db=db, user_id=user_id, values={"is_active": False}):
+        raise errors.UserNotFoundError
+    db.commit()
+    job = job_runner.submit(
+        users.PURGE_USER_JOB, {"user_id": user_id}, owner_id=current_user.id
+    )
+    return accepted_response(request=request, job=job)
+
+
 def _get_user_by_id(
     current_user: db_models.User, user_id: ft.Id, db: Session
 ) -> db_models.User:
@@ -147,3 +323,40 @@ def _get_user_by_id(
     if user_model := query.first():
         return user_model
     raise errors.UserNotFoundError
+
+
+async def _get_sparse_user(
+    current_user: db_models.User,
+    user_id: int,
+    db: Session,
+    fields: str | None,
+    include: str | None,
+    todos_fields: str | None,
+    todos_limit: int,
+    todos_offset: int,
+) -> Response:
+    """Get a user's requested fields, and a page of their todos if included."""
+    user_fields = fieldsets.parse_fields(fields, fieldsets.USER_FIELDS)
+    includes = fieldsets.parse_include(include, fieldsets.USER_INCLUDES)
+    if not current_user.is_admin() and user_id != current_user.id:
+        raise errors.UserNotFoundError
+    rows = users.get_user_rows(db=db, fields=user_fields, user_id=user_id)
+    if not rows:
+        raise errors.UserNotFoundError
+    content = fieldsets.pick(rows[0]._mapping, user_fields)
+    if "todos" in includes:
+        await todo_write_buffer.flush_owner(user_id)
+        page = todos.get_todo_page(
+            db=db,
+            owner_id=user_id,
+            limit=todos_limit,
+            offset=todos_offset,
+            fields=fieldsets.parse_fields(todos_fields, fieldsets.TODO_FIELDS),
+        )
+        content["todos"] = {
+            "items": [row._asdict() for row in page.todos],
+            "next_offset": page.next_offset,
+        }
+    return responses.FastJSONResponse(
+        content, headers={"ETag": etags.make_etag(rows[0].version)}
+    )
@@ -1,3 +1,6 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
@@ -28,6 +31,11 @@ SECRET_KEY = "a32739cd7e677c1b8dfcf560a68d59793efdd035fa14dc488192b815d3b5e498"
 ALGORITHM = "HS256"
 TOKEN_EXPIRATION = timedelta(minutes=15)
 
+# Set by `reuse_authentication`: (access token, the user it authenticated)
+_authenticated: ContextVar[tuple[str, db_models.User] | None] = ContextVar(
+    "authenticated", default=None
+)
+
 
 # ------------ Functions ------------
 async def get_current_user_optional_by_cookie(
@@ -69,12 +77,33 @@ async def get_current_user_required_by_token(
     """Get the current user from the access_token."""
     if not access_token:
         raise errors.UserNotAuthenticatedError
+    if user := _reused_user(access_token):
+        return user
 
     payload = await parse_access_token(access_token=access_token)
     user_id = int(payload.get("user_id", 0))  # type: ignore[arg-type]
     return get_current_user_by_id(user_id, db)
 
 
+async def get_user_id_required_by_cookie(
+    access_token: OptionalCookieDependency = None,
+) -> int:
+    """Get the current user's id from the cookie, without loading the user."""
+    if not access_token:
+        raise errors.UserNotAuthenticatedError
+
+    payload = await parse_access_token(access_token=access_token)
+    return int(payload["user_id"])  # type: ignore[arg-type]
+
+
+async def get_user_id_required_by_token(access_token: TokenDependency) -> int:
+    """Get the current user's id from the token, without loading the user."""
+    if user := _reused_user(access_token):
+        return user.id
+    payload = await parse_access_token(access_token=access_token)
+    return int(payload["user_id"])  # type: ignore[arg-type]
+
+
 async def refresh_token(
     access_token: str, remaining_time: int | None = None
 ) -> web_models.Token:
@@ -153,6 +182,27 @@ def get_current_user_by_id(user_id: ft.Id, db: DBDependency) -> db_models.User:
     raise errors.UserNotFoundError
 
 
+@contextmanager
+def reuse_authentication(access_token: str, user: db_models.User) -> Iterator[None]:
+    """Authenticate requests in the block bearing `access_token` as `user`.
+
+    Skips decoding the token and loading the user again, e.g. for each
+    request of a batch.
+    """
+    token = _authenticated.set((access_token, user))
+    try:
+        yield
+    finally:
+        _authenticated.reset(token)
+
+
+def _reused_user(access_token: str) -> db_models.User | None:
+    authenticated = _authenticated.get()
+    if authenticated is not None and authenticated[0] == access_token:
+        return authenticated[1]
+    return None
+
+
 #  ----------- Exported Dependencies -----------
 TokenRequiredUser = Annotated[
     db_models.User, Depends(get_current_user_required_by_token)
@@ -166,3 +216,5 @@ LoggedInUserOptional = Annotated[
     Depends(get_current_user_optional_by_cookie),
 ]
 LoggedInUser = Annotated[db_models.User, Depends(get_current_user_required_by_cookie)]
+TokenRequiredUserId = Annotated[int, Depends(get_user_id_required_by_token)]
+LoggedInUserId = Annotated[int, Depends(get_user_id_required_by_cookie)]
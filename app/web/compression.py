@@ -0,0 +1,242 @@
+"""Response compression middleware for the root app.
+
+Compresses responses with brotli (when the optional `brotli` package is
+installed) or gzip, depending on the client's `Accept-Encoding` header.
+Small bodies and non-compressible content types are passed through untouched.
+Streaming responses are compressed chunk by chunk and flushed after each chunk,
+so streamed content still reaches the client promptly.
+"""
+import zlib
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# ----------- Constants -----------
+GZIP = "gzip"
+BROTLI = "br"
+DEFAULT_MINIMUM_SIZE = 500
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+DEFAULT_CONTENT_TYPES = frozenset(
+    {
+        "text/html",
+        "text/css",
+        "text/plain",
+        "text/javascript",
+        "application/javascript",
+        "application/json",
+        "image/svg+xml",
+    }
+)
+NO_BODY_STATUSES = frozenset({204, 304})
+
+
+# ----------- Compressors -----------
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    def flush(self) -> bytes:
+        ...
+
+    def finish(self) -> bytes:
+        ...
+
+
+class _BrotliStream(Protocol):
+    """The parts of brotli's (untyped) `Compressor` used here."""
+
+    def process(self, data: bytes) -> bytes:
+        ...
+
+    def flush(self) -> bytes:
+        ...
+
+    def finish(self) -> bytes:
+        ...
+
+
+class GzipCompressor:
+    """Streaming gzip compressor."""
+
+    def __init__(self, level: int = DEFAULT_GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    """Streaming brotli compressor."""
+
+    def __init__(self, quality: int = DEFAULT_BROTLI_QUALITY):
+        self._compressor: _BrotliStream = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+# ----------- Negotiation -----------
+def parse_accept_encoding(value: str) -> dict[str, float]:
+    """Map each coding in an `Accept-Encoding` header to its q-value."""
+    qvalues: dict[str, float] = {}
+    for token in value.split(","):
+        coding, *params = (part.strip() for part in token.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, param_value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = min(max(float(param_value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.lower()] = q
+    return qvalues
+
+
+# ----------- Middleware -----------
+class CompressionMiddleware:
+    """Compress responses above `minimum_size` with an allowed content type."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = DEFAULT_MINIMUM_SIZE,
+        content_types: frozenset[str] = DEFAULT_CONTENT_TYPES,
+        gzip_level: int = DEFAULT_GZIP_LEVEL,
+        brotli_quality: int = DEFAULT_BROTLI_QUALITY,
+        use_brotli: bool = True,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = content_types
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.use_brotli = use_brotli and brotli is not None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.select_encoding(Headers(scope=scope))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def select_encoding(self, headers: Headers) -> str | None:
+        """Pick the best encoding the client accepts, or None.
+
+        The client's highest q-value wins, and brotli wins ties. `q=0` refuses
+        an encoding; `*` stands for any encoding not listed.
+        """
+        qvalues = parse_accept_encoding(headers.get("accept-encoding", ""))
+        candidates = [BROTLI, GZIP] if self.use_brotli else [GZIP]
+        best, best_q = None, 0.0
+        for encoding in candidates:
+            q = qvalues.get(encoding, qvalues.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def make_compressor(self, encoding: str) -> Compressor:
+        if encoding == BROTLI:
+            return BrotliCompressor(quality=self.brotli_quality)
+        return GzipCompressor(level=self.gzip_level)
+
+    def is_compressible(self, headers: MutableHeaders) -> bool:
+        """Whether a response with these headers should be compressed."""
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return content_type in self.content_types
+
+
+class _CompressionResponder:
+    """Wraps `send` for a single response, compressing the body if worthwhile."""
+
+    def __init__(
+        self, middleware: CompressionMiddleware, encoding: str, send: Send
+    ) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send: Send = self._send_first_body
+        self._downstream = send
+        self._start_message: Message = {}
+        self._compressor: Compressor | None = None
+
+    async def _send_first_body(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self._start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self._downstream(message)
+            return
+
+        headers = MutableHeaders(raw=self._start_message["headers"])
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if (
+            self._start_message["status"] in NO_BODY_STATUSES
+            or not self.middleware.is_compressible(headers)
+            or (not more_body and len(body) < self.middleware.minimum_size)
+        ):
+            await self._passthrough(message)
+            return
+
+        compressor = self.middleware.make_compressor(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if more_body:
+            # Length of a streamed body isn't known upfront.
+            del headers["Content-Length"]
+            self._compressor = compressor
+            self.send = self._send_streaming_body
+            await self._downstream(self._start_message)
+            await self._send_streaming_body(message)
+            return
+
+        compressed = compressor.compress(body) + compressor.finish()
+        headers["Content-Length"] = str(len(compressed))
+        await self._downstream(self._start_message)
+        await self._downstream(
+            {"type": "http.response.body", "body": compressed, "more_body": False}
+        )
+
+    async def _passthrough(self, message: Message) -> None:
+        self.send = self._downstream
+        await self._downstream(self._start_message)
+        await self._downstream(message)
+
+    async def _send_streaming_body(self, message: Message) -> None:
+        if message["type"] != "http.response.body":
+            await self._downstream(message)
+            return
+        assert self._compressor is not None
+        more_body: bool = message.get("more_body", False)
+        chunk = self._compressor.compress(message.get("body", b""))
+        chunk += self._compressor.flush() if more_body else self._compressor.finish()
+        await self._downstream(
+            {"type": "http.response.body", "body": chunk, "more_body": more_body}
+        )
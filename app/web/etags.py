@@ -0,0 +1,25 @@
+"""ETag / If-Match helpers for optimistic concurrency on versioned rows."""
+from typing import Annotated
+
+from fastapi import Header
+
+IfMatchHeader = Annotated[str | None, Header()]
+
+
+def make_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: str | None) -> int | None:
+    """Get the version an If-Match header expects, or None to skip the check.
+
+    A tag that isn't one of our versions returns 0, which never matches, so the
+    request fails its precondition as it should.
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.split(",")[0].strip().removeprefix("W/").strip('"')
+    try:
+        return int(tag)
+    except ValueError:
+        return 0
@@ -1,10 +1,15 @@
 from fastapi import FastAPI, Request, status
 from fastapi.responses import RedirectResponse
+from starlette.templating import _TemplateResponse
 
 from app.web import errors
+from app.web.html.const import templates
 from app.web.html.flash_messages import FlashCategory, FlashMessage
+from app.web.html.routes.errors import WebAppError
 
 ERROR_TEMPLATE = "errors/general_error.html"
+ERROR_FRAGMENT_TEMPLATE = "shared/partials/flash_message.html"
+FLASH_MESSAGES_TARGET = "#flash-messages"
 
 
 def register_error_handlers(app: FastAPI) -> None:
@@ -15,7 +20,7 @@ def register_error_handlers(app: FastAPI) -> None:
         FlashMessage(
             msg="Login session expired. Please log in again.",
             category=FlashCategory.ERROR,
-        )
+        ).flash(request)
         return RedirectResponse(
             request.url_for("html:login_get"), status_code=status.HTTP_303_SEE_OTHER
         )
@@ -27,7 +32,7 @@ def register_error_handlers(app: FastAPI) -> None:
         FlashMessage(
             msg="Please log in to use that service.",
             category=FlashCategory.ERROR,
-        )
+        ).flash(request)
         return RedirectResponse(
             request.url_for("html:login_get"), status_code=status.HTTP_303_SEE_OTHER
         )
@@ -35,9 +40,30 @@ def register_error_handlers(app: FastAPI) -> None:
     @app.exception_handler(errors.WebError)
     async def web_error_handler(
         request: Request, error: errors.WebError
-    ) -> RedirectResponse:
-        return RedirectResponse(
-            request.url_for("html:general_error").include_query_params(
-                detail=error.detail, status_code=error.status_code
+    ) -> _TemplateResponse:
+        """Render the error in place, rather than redirecting to the error page.
+
+        HTMX requests get just a flash message fragment, retargeted into the
+        page's flash messages container.
+        """
+        if request.headers.get("HX-Request"):
+            return templates.TemplateResponse(
+                ERROR_FRAGMENT_TEMPLATE,
+                {
+                    "request": request,
+                    "message": FlashMessage(
+                        msg=error.detail, category=FlashCategory.ERROR
+                    ),
+                },
+                status_code=error.status_code,
+                headers={
+                    "HX-Retarget": FLASH_MESSAGES_TARGET,
+                    "HX-Reswap": "afterbegin",
+                },
             )
+        html_error = WebAppError(detail=error.detail, status_code=error.status_code)
+        return templates.TemplateResponse(
+            ERROR_TEMPLATE,
+            {"request": request, "error": html_error},
+            status_code=html_error.status_code,
         )
@@ -20,11 +20,26 @@ class FlashMessage(BaseModel):
     timeout: int | None = None
 
     def flash(self, request: Request) -> None:
-        if MESSAGES not in request.session:
-            request.session[MESSAGES] = []
-        request.session[MESSAGES].append(self.model_dump())
+        """Store the message in the session as a compact [msg, category, timeout]."""
+        messages = request.session.get(MESSAGES, [])
+        request.session[MESSAGES] = [
+            *messages,
+            [self.msg, self.category.value, self.timeout],
+        ]
 
 
 def get_flashed_messages(request: Request) -> list[FlashMessage]:
-    message = cast(list[dict], request.session.pop(MESSAGES, []))
-    return [FlashMessage(**msg) for msg in message]
+    """Pop the flashed messages from the session.
+
+    The session is only modified when there are messages to pop. Messages were
+    validated when flashed, so they're rebuilt here without re-validating.
+    """
+    messages = cast(list[list] | None, request.session.pop(MESSAGES, None))
+    if not messages:
+        return []
+    return [
+        FlashMessage.model_construct(
+            msg=msg, category=FlashCategory(category), timeout=timeout
+        )
+        for msg, category, timeout in messages
+    ]
@@ -0,0 +1,19 @@
+"""Fragment-aware responses for HTMX requests.
+
+Only send markup when the client actually needs it:
+
+- `no_swap`: the client's DOM is already correct (204, which htmx never swaps).
+- `empty_swap`: the target should be emptied or removed, e.g. `hx-swap="delete"`
+  (htmx ignores 204s, so this is an empty 200).
+"""
+from fastapi import Response, status
+from fastapi.responses import HTMLResponse
+
+
+def no_swap() -> Response:
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+def empty_swap() -> HTMLResponse:
+    return HTMLResponse(content="", status_code=status.HTTP_200_OK)
+
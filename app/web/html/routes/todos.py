@@ -1,7 +1,9 @@
-from typing import Annotated, cast
+import secrets
+from collections.abc import AsyncIterator
+from typing import Annotated, NoReturn, cast
 
 from fastapi import APIRouter, Path, Request, status
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from wtforms import (
     BooleanField,
     Form,
@@ -9,31 +11,91 @@ from wtforms import (
     validators,
 )
 
-from app.datastore import db_models
-from app.datastore.database import DBDependency
-from app.services import todos
+from app.datastore.database import DBDependency, Session
+from app.services import broadcast, todo_archive, todo_sync, todos
+from app.services.broadcast import todo_hub
+from app.services.write_buffer import todo_write_buffer
 from app.web import errors
-from app.web.api import api_models
-from app.web.auth import LoggedInUser
+from app.web.auth import LoggedInUser, LoggedInUserId
+from app.web.html import fragments
 from app.web.html.const import templates
 
 # ----------- Routers -----------
 router = APIRouter(tags=["todos"], prefix="/todos")
 
 TODO_PARTIAL_TEMPLATE = "todos/partials/todo.html"
+TODO_EVENT_TEMPLATE = "todos/partials/todo_event.html"
+# Session key for the user's "show archived todos" setting
+SHOW_ARCHIVED = "show_archived"
 
 
 @router.get("", response_class=HTMLResponse)
 async def get_todos(request: Request, db: DBDependency, current_user: LoggedInUser):
-    todos_list_db = await todos.get_todos_list(db, current_user)
-
-    todos_list_api = [
-        api_models.TodoOutLimited(**todo.__dict__) for todo in todos_list_db
+    # Plain rows (not ORM instances), with any buffered edits laid over them
+    todos_list = [
+        {**row._mapping, **todo_write_buffer.pending_values(row.id)}
+        for row in todos.get_todo_rows(db=db, owner_id=current_user.id)
     ]
+    show_archived = bool(request.session.get(SHOW_ARCHIVED, False))
+    archived_todos = (
+        todo_archive.get_archived_todos(db=db, owner_id=current_user.id)
+        if show_archived
+        else []
+    )
 
     return templates.TemplateResponse(
         "todos/todos.html",
-        {"request": request, "current_user": current_user, "todos": todos_list_api},
+        {
+            "request": request,
+            "current_user": current_user,
+            "todos": todos_list,
+            "archived_todos": archived_todos,
+            "show_archived": show_archived,
+            "client_id": secrets.token_hex(8),
+        },
+    )
+
+
+@router.post("/archived")
+async def toggle_archived(request: Request, current_user: LoggedInUser):
+    """Show or hide archived todos on the user's todo list."""
+    if request.session.get(SHOW_ARCHIVED, False):
+        del request.session[SHOW_ARCHIVED]
+    else:
+        request.session[SHOW_ARCHIVED] = True
+    return RedirectResponse(
+        url=request.url_for("html:get_todos"), status_code=status.HTTP_303_SEE_OTHER
+    )
+
+
+@router.get("/events")
+async def todo_events(
+    request: Request, user_id: LoggedInUserId, client_id: str | None = None
+) -> StreamingResponse:
+    """Stream the user's todo changes as out-of-band swaps, over SSE.
+
+    Changes made by the page identified by `client_id` aren't sent back to it.
+    """
+    template = templates.get_template(TODO_EVENT_TEMPLATE)
+
+    async def stream() -> AsyncIterator[str]:
+        async for event in todo_hub.listen(user_id=user_id, client_id=client_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            content = template.render(
+                {
+                    "request": request,
+                    "action": event.action,
+                    "todo": {"id": event.todo_id, **event.fields},
+                }
+            )
+            yield broadcast.format_sse("todo", content)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -52,7 +114,15 @@ async def add_todo(request: Request, db: DBDependency, current_user: LoggedInUse
     todo = await todos.add_todo(
         db=db, current_user=current_user, title=create_todo_form.title.data
     )
-    db.refresh(todo)
+    todo_hub.publish(
+        broadcast.TodoEvent(
+            action=broadcast.CREATE,
+            todo_id=todo.id,
+            owner_id=current_user.id,
+            fields=broadcast.todo_fields(todo),
+            origin=request.headers.get(broadcast.CLIENT_ID_HEADER),
+        )
+    )
 
     return templates.TemplateResponse(
         TODO_PARTIAL_TEMPLATE,
@@ -76,18 +146,37 @@ async def update_todo(
 ):
     form_data = await request.form()
     update_todo_form = UpdateTodoForm(**form_data)
-    todo = db.query(db_models.Todo).filter(db_models.Todo.id == todo_id).first()
-    if not todo:
-        raise errors.TodoNotFoundError
-    if todo.owner_id != current_user.id:
-        raise errors.TodoNotOwnedError
-    todo.title = update_todo_form.title.data
-    todo.completed = update_todo_form.completed.data
-    db.commit()
-    db.refresh(todo)
+    values = {
+        "title": update_todo_form.title.data,
+        "completed": update_todo_form.completed.data,
+    }
+    if todo_write_buffer.pending_owner(todo_id) == current_user.id:
+        # Follow-up edits are merged and written once the buffer flushes.
+        todo_write_buffer.write(
+            todo_id=todo_id, owner_id=current_user.id, values=values
+        )
+    else:
+        if not todos.update_todo(
+            db=db, todo_id=todo_id, values=values, owner_id=current_user.id
+        ):
+            _raise_todo_missing(db=db, todo_id=todo_id)
+        db.commit()
+        todo_write_buffer.track(todo_id=todo_id, owner_id=current_user.id)
+    todo_hub.publish(
+        broadcast.TodoEvent(
+            action=broadcast.UPDATE,
+            todo_id=todo_id,
+            owner_id=current_user.id,
+            fields=values,
+            origin=request.headers.get(broadcast.CLIENT_ID_HEADER),
+        )
+    )
+    if request.headers.get("HX-Trigger-Name") != "completed":
+        # The client's input already shows the new title.
+        return fragments.no_swap()
     return templates.TemplateResponse(
         TODO_PARTIAL_TEMPLATE,
-        {"request": request, "todo": todo},
+        {"request": request, "todo": {"id": todo_id, **values}},
     )
 
 
@@ -98,14 +187,25 @@ async def delete_todo(
     db: DBDependency,
     current_user: LoggedInUser,
 ):
-    todo = db.query(db_models.Todo).filter(db_models.Todo.id == todo_id).first()
-    if not todo:
-        raise errors.TodoNotFoundError
-    if todo.owner_id != current_user.id:
-        raise errors.TodoNotOwnedError
-    db.delete(todo)
+    if not todos.delete_todo(db=db, todo_id=todo_id, owner_id=current_user.id):
+        _raise_todo_missing(db=db, todo_id=todo_id)
+    todo_write_buffer.discard(todo_id)
+    todo_sync.record_deletion(db=db, todo_id=todo_id, owner_id=current_user.id)
     db.commit()
-    return templates.TemplateResponse(
-        TODO_PARTIAL_TEMPLATE,
-        {"request": request, "todo": todo},
+    todo_hub.publish(
+        broadcast.TodoEvent(
+            action=broadcast.DELETE,
+            todo_id=todo_id,
+            owner_id=current_user.id,
+            origin=request.headers.get(broadcast.CLIENT_ID_HEADER),
+        )
     )
+    return fragments.empty_swap()
+
+
+# ------------ Helpers ------------
+def _raise_todo_missing(db: Session, todo_id: int) -> NoReturn:
+    """Raise the right error for a todo that a mutation didn't match."""
+    if todos.get_todo_owner_id(db=db, todo_id=todo_id) is None:
+        raise errors.TodoNotFoundError
+    raise errors.TodoNotOwnedError
@@ -1,17 +1,45 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.responses import RedirectResponse
-from starlette.middleware.sessions import SessionMiddleware
 
 from app.datastore import db_models
 from app.datastore.database import engine
+from app.services import todo_sync
+from app.services.jobs import job_runner
+from app.services.write_buffer import todo_write_buffer
+from app.web import metrics, sessions
 from app.web.api import main as api_main
+from app.web.compression import CompressionMiddleware
 from app.web.html import main as html_main
+from app.web.profiling import ProfilerMiddleware
+from app.web.query_timing import QueryTimingMiddleware
+
+COMPRESSION_MINIMUM_SIZE = 500
+
 
-SESSION_SECRET = "SUPER-SECRET-KEY"
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_runner.start()
+    tombstone_purges = asyncio.create_task(todo_sync.schedule_purges())
+    yield
+    tombstone_purges.cancel()
+    await job_runner.stop()
+    todo_write_buffer.flush()
+    metrics.mark_process_dead()
 
-app = FastAPI()
 
-app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    sessions.ServerSessionMiddleware, backend=sessions.backend_from_config()
+)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+app.add_middleware(QueryTimingMiddleware)
+app.add_middleware(ProfilerMiddleware)
+# Outermost, so latency covers the whole stack and sizes are bytes on the wire
+app.add_middleware(metrics.PrometheusMiddleware)
 
 db_models.Base.metadata.create_all(bind=engine)
 
@@ -21,5 +49,7 @@ async def api_home(request: Request):
     return RedirectResponse(url=request.url_for("api:swagger_ui_html"), status_code=302)
 
 
+app.add_route("/metrics", metrics.metrics_response, include_in_schema=False)
+
 app.mount("/api", api_main.app, name="api")
 app.mount("/", html_main.app, name="html")
@@ -0,0 +1,156 @@
+"""Prometheus request metrics for the root app.
+
+Records, per method and route, request counts (by status), latency and
+response size histograms, and in-flight requests. Routes are labelled with
+their template (`/api/todos/{todo_id}`), not the raw path, so label
+cardinality stays bounded by the number of routes.
+
+With several worker processes, set the `PROMETHEUS_MULTIPROC_DIR` environment
+variable (to an empty directory, before the workers start): each process then
+writes its metrics there, and `/metrics` aggregates all of them.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import BaseRoute, Match, Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# ----------- Constants -----------
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+UNMATCHED_ROUTE = "<unmatched>"
+ROUTE_SCOPE_KEY = "metrics.route"
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# ----------- Metrics -----------
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests, by route and response status.",
+    ["method", "route", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the end of its response.",
+    ["method", "route"],
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Response body size, as sent (after compression).",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled.",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements run per request.",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Total time spent in SQL statements per request.",
+    ["route"],
+)
+
+
+def multiprocess_enabled() -> bool:
+    return MULTIPROC_DIR_ENV in os.environ
+
+
+def route_template(routes: list[BaseRoute], scope: Scope) -> str | None:
+    """The template of the route matching the request, following mounts."""
+    partial: str | None = None
+    for route in routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.NONE:
+            continue
+        if isinstance(route, Mount) and route.routes:
+            nested = route_template(route.routes, {**scope, **child_scope})
+            template = route.path + nested if nested is not None else None
+        else:
+            template = getattr(route, "path", None)
+        if match == Match.FULL:
+            return template
+        partial = partial or template  # e.g. a method not allowed
+    return partial
+
+
+def request_route(scope: Scope) -> str:
+    """The request's route template label, resolved once per request."""
+    route: str | None = scope.get(ROUTE_SCOPE_KEY)
+    if route is None:
+        route = route_template(scope["app"].routes, scope) or UNMATCHED_ROUTE
+        scope[ROUTE_SCOPE_KEY] = route
+    return route
+
+
+# ----------- Middleware -----------
+class PrometheusMiddleware:
+    """Record request metrics for every HTTP request."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = request_route(scope)
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_DURATION.labels(method, route).observe(
+                time.perf_counter() - start
+            )
+            RESPONSE_SIZE.labels(method, route).observe(size)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            in_progress.dec()
+
+
+# ----------- Endpoint -----------
+def metrics_response(request: Request) -> Response:
+    """Prometheus text exposition of all metrics (of every worker process)."""
+    registry = REGISTRY
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead() -> None:
+    """Drop this process's live gauges, on shutdown, in multiprocess mode."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
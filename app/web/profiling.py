@@ -0,0 +1,145 @@
+"""On-demand request profiling, for admins.
+
+Add `?profile=<format>` (or an `X-Profile: <format>` header) to any request,
+authenticated as an admin, to run it under pyinstrument's sampling profiler.
+The formats are:
+
+- `html`: respond with pyinstrument's interactive report instead of the
+  normal response.
+- `speedscope`: respond with a speedscope JSON profile (open it at
+  https://www.speedscope.app).
+- `store`: send the normal response, and write a speedscope profile to
+  `PROFILE_DIR`; the file name is in the `X-Profile-File` response header.
+
+Requests without the flag only pay for a header and query string check, and
+the flag is ignored for anyone but an admin. Profiling needs the optional
+`pyinstrument` package. Streaming responses (e.g. SSE) can't be profiled, as
+the response is buffered until the request finishes.
+"""
+import time
+import uuid
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.datastore import db_models
+from app.datastore.database import SessionLocal
+from app.web import auth, errors
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pragma: no cover - optional dependency
+    Profiler = None  # type: ignore[assignment, misc]
+
+# ----------- Constants -----------
+PROFILE_PARAM = "profile"
+PROFILE_HEADER = "x-profile"
+PROFILE_FILE_HEADER = "X-Profile-File"
+HTML = "html"
+SPEEDSCOPE = "speedscope"
+STORE = "store"
+FORMATS = frozenset({HTML, SPEEDSCOPE, STORE})
+SPEEDSCOPE_DISPOSITION = 'attachment; filename="profile.speedscope.json"'
+PROFILE_DIR = Path("profiles")
+SAMPLE_INTERVAL = 0.001  # seconds
+
+
+class ProfilerMiddleware:
+    """Profile requests that ask for it, if made by an admin."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        profile_dir: Path = PROFILE_DIR,
+        interval: float = SAMPLE_INTERVAL,
+    ) -> None:
+        self.app = app
+        self.profile_dir = profile_dir
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if Profiler is None or scope["type"] != "http" or not _profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        output_format = request.query_params.get(
+            PROFILE_PARAM, request.headers.get(PROFILE_HEADER, "")
+        )
+        if output_format not in FORMATS or not await _is_admin(request):
+            await self.app(scope, receive, send)
+            return
+
+        messages: list[Message] = []
+
+        async def buffer(message: Message) -> None:
+            messages.append(message)
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, buffer)
+        finally:
+            profiler.stop()
+
+        if output_format == HTML:
+            response: Response = HTMLResponse(profiler.output_html())
+        elif output_format == SPEEDSCOPE:
+            response = Response(
+                profiler.output(renderer=SpeedscopeRenderer()),
+                media_type="application/json",
+                headers={"Content-Disposition": SPEEDSCOPE_DISPOSITION},
+            )
+        else:
+            path = self._store(profiler)
+            for message in messages:
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", []).append(
+                        (PROFILE_FILE_HEADER.lower().encode(), path.name.encode())
+                    )
+                await send(message)
+            return
+        await response(scope, receive, send)
+
+    def _store(self, profiler: "Profiler") -> Path:
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            ".speedscope.json"
+        )
+        path.write_text(profiler.output(renderer=SpeedscopeRenderer()))
+        return path
+
+
+# ----------- Helpers -----------
+def _profile_requested(scope: Scope) -> bool:
+    """Cheap check for the profile flag, before parsing anything."""
+    if f"{PROFILE_PARAM}=".encode() in scope.get("query_string", b""):
+        return True
+    return any(name == PROFILE_HEADER.encode() for name, _ in scope["headers"])
+
+
+async def _is_admin(request: Request) -> bool:
+    """Whether the request's bearer token (or cookie) belongs to an admin."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    access_token = token if scheme.lower() == "bearer" else None
+    access_token = access_token or request.cookies.get("access_token")
+    if not access_token:
+        return False
+    try:
+        payload = await auth.parse_access_token(access_token=access_token)
+        # Off the event loop, as this runs before (and outside) the route
+        user_id = int(payload["user_id"])  # type: ignore[arg-type]
+        user = await run_in_threadpool(_get_user, user_id)
+    except errors.WebError:
+        return False
+    return user.is_admin()
+
+
+def _get_user(user_id: int) -> db_models.User:
+    with SessionLocal() as db:
+        return auth.get_current_user_by_id(user_id, db)
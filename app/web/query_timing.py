@@ -0,0 +1,61 @@
+"""Per-request SQL statement counts and time.
+
+Reports each request's statement count and database time in a
+`Server-Timing` header (shown in the browser's network panel) and as metrics,
+and logs requests that run suspiciously many statements, which usually means
+a lazy load in a loop (e.g. reading `todo.owner` for every todo).
+"""
+import logging
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.datastore import query_stats
+from app.web import metrics
+
+logger = logging.getLogger(__name__)
+
+MANY_QUERIES_THRESHOLD = 20
+
+
+def server_timing(stats: query_stats.QueryStats) -> str:
+    return f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+
+
+class QueryTimingMiddleware:
+    """Track the SQL statements each HTTP request runs."""
+
+    def __init__(
+        self, app: ASGIApp, many_queries_threshold: int = MANY_QUERIES_THRESHOLD
+    ) -> None:
+        self.app = app
+        self.many_queries_threshold = many_queries_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = metrics.request_route(scope)
+        with query_stats.track_queries(route) as stats:
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    # Statements run while streaming the body aren't included.
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", server_timing(stats)
+                    )
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        metrics.DB_QUERIES.labels(route).observe(stats.count)
+        metrics.DB_DURATION.labels(route).observe(stats.duration)
+        if stats.count > self.many_queries_threshold:
+            logger.warning(
+                "%s %s ran %d queries (%.1f ms)",
+                scope["method"],
+                route,
+                stats.count,
+                stats.duration * 1000,
+            )
@@ -0,0 +1,281 @@
+"""Server-side sessions.
+
+Only an opaque session id is stored in the cookie; the session data lives in a
+pluggable backend, chosen with the `SESSION_BACKEND` environment variable.
+Session data is loaded lazily, the first time `request.session` is actually
+read or written, and is only written back when it was modified. A blocking
+(database) backend instead loads up front, in the threadpool, whenever the
+request has a session cookie.
+
+Nested values are not tracked: reassign a key (`session[key] = [...]`) rather
+than mutating its value in place.
+"""
+import json
+import os
+import secrets
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Iterator, MutableMapping
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as postgres_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.datastore import db_models
+from app.datastore.database import SessionLocal
+
+# ----------- Constants -----------
+SESSION_COOKIE = "session_id"
+SESSION_MAX_AGE = 14 * 24 * 60 * 60  # 14 days, in seconds
+MEMORY_MAX_ENTRIES = 10_000
+# "memory" (a single worker process only) or "database" (shared by workers)
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+
+
+# ----------- Backends -----------
+class SessionBackend(ABC):
+    """Storage for session data, keyed by session id."""
+
+    # Whether calls do I/O, and must run in the threadpool rather than the loop
+    blocking: bool = False
+
+    @abstractmethod
+    def load(self, session_id: str) -> dict[str, Any] | None:
+        """Return the session data, or None if the session doesn't exist."""
+
+    @abstractmethod
+    def save(self, session_id: str, data: dict[str, Any], max_age: int) -> None:
+        """Create or replace the session data."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Delete the session, if it exists."""
+
+
+class MemorySessionBackend(SessionBackend):
+    """In-process LRU session store.
+
+    Sessions are lost on restart and aren't shared between worker processes.
+    """
+
+    def __init__(self, max_entries: int = MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._sessions: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def load(self, session_id: str) -> dict[str, Any] | None:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        session: dict[str, Any] = json.loads(data)
+        return session
+
+    def save(self, session_id: str, data: dict[str, Any], max_age: int) -> None:
+        self._sessions[session_id] = (time.monotonic() + max_age, json.dumps(data))
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+
+class DatabaseSessionBackend(SessionBackend):
+    """Session store backed by the `sessions` table (SQLite or Postgres)."""
+
+    blocking = True
+
+    def __init__(self, session_factory: sessionmaker = SessionLocal):
+        self.session_factory = session_factory
+
+    def load(self, session_id: str) -> dict[str, Any] | None:
+        query = select(db_models.WebSession.data).where(
+            db_models.WebSession.id == session_id,
+            db_models.WebSession.expires_at > datetime.now(UTC),
+        )
+        with self.session_factory() as db:
+            session: dict[str, Any] | None = db.scalar(query)
+        return session
+
+    def save(self, session_id: str, data: dict[str, Any], max_age: int) -> None:
+        expires_at = datetime.now(UTC) + timedelta(seconds=max_age)
+        with self.session_factory.begin() as db:
+            insert = (
+                postgres_insert
+                if db.get_bind().dialect.name == "postgresql"
+                else sqlite_insert
+            )
+            statement = insert(db_models.WebSession).values(
+                id=session_id, data=data, expires_at=expires_at
+            )
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[db_models.WebSession.id],
+                    set_={"data": data, "expires_at": expires_at},
+                )
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self.session_factory.begin() as db:
+            db.execute(
+                delete(db_models.WebSession).where(
+                    db_models.WebSession.id == session_id
+                )
+            )
+
+    def purge_expired(self) -> int:
+        """Delete expired sessions, returning the number deleted."""
+        with self.session_factory.begin() as db:
+            result = db.execute(
+                delete(db_models.WebSession).where(
+                    db_models.WebSession.expires_at <= datetime.now(UTC)
+                )
+            )
+            deleted: int = result.rowcount
+        return deleted
+
+
+def backend_from_config(name: str = SESSION_BACKEND) -> SessionBackend:
+    """The session backend called `name`."""
+    backends: dict[str, type[SessionBackend]] = {
+        "memory": MemorySessionBackend,
+        "database": DatabaseSessionBackend,
+    }
+    if name not in backends:
+        raise ValueError(f"Unknown session backend: {name}")
+    return backends[name]()
+
+
+# ----------- Session -----------
+class LazySession(MutableMapping[str, Any]):
+    """Session data that is only fetched from the backend when first used."""
+
+    def __init__(self, backend: SessionBackend, session_id: str | None):
+        self.session_id = session_id
+        self.modified = False
+        self._backend = backend
+        self._data: dict[str, Any] | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None
+
+    def load(self) -> None:
+        """Fetch the session data now, rather than on first use."""
+        self._load()
+
+    def _load(self) -> dict[str, Any]:
+        if self._data is None:
+            data = self._backend.load(self.session_id) if self.session_id else None
+            if data is None:
+                # Never adopt an unknown id from the client.
+                self.session_id = None
+            self._data = data or {}
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self._load()[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key: str) -> None:
+        del self._load()[key]
+        self.modified = True
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._load()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def clear(self) -> None:
+        if self._load():
+            self._data = {}
+            self.modified = True
+
+
+# ----------- Middleware -----------
+class ServerSessionMiddleware:
+    """Provide `request.session`, backed by a server-side `SessionBackend`."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: SessionBackend,
+        session_cookie: str = SESSION_COOKIE,
+        max_age: int = SESSION_MAX_AGE,
+        path: str = "/",
+        same_site: str = "lax",
+        https_only: bool = False,
+    ) -> None:
+        self.app = app
+        self.backend = backend
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.cookie_flags = f"path={path}; httponly; samesite={same_site}"
+        if https_only:
+            self.cookie_flags += "; secure"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        session = LazySession(
+            self.backend, connection.cookies.get(self.session_cookie)
+        )
+        scope["session"] = session
+        if self.backend.blocking and session.session_id is not None:
+            # A lazy load would block the event loop, wherever the session is
+            # first used (even in a template), so load it in the threadpool.
+            await run_in_threadpool(session.load)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and session.modified:
+                headers = MutableHeaders(scope=message)
+                if self.backend.blocking:
+                    await run_in_threadpool(self.commit, session, headers)
+                else:
+                    self.commit(session, headers)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def commit(self, session: LazySession, headers: MutableHeaders) -> None:
+        """Persist a modified session and set (or clear) the cookie."""
+        if len(session):
+            if session.session_id is None:
+                session.session_id = secrets.token_urlsafe(32)
+            self.backend.save(session.session_id, dict(session), self.max_age)
+            headers.append(
+                "Set-Cookie",
+                f"{self.session_cookie}={session.session_id}; "
+                f"max-age={self.max_age}; {self.cookie_flags}",
+            )
+        elif session.session_id is not None:
+            # Empty sessions aren't kept, so later requests skip the lookup.
+            self.backend.delete(session.session_id)
+            headers.append(
+                "Set-Cookie",
+                f"{self.session_cookie}=null; "
+                "expires=Thu, 01 Jan 1970 00:00:00 GMT; "
+                f"max-age=0; {self.cookie_flags}",
+            )
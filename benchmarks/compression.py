@@ -0,0 +1,85 @@
+"""Benchmark response compression: bytes on the wire and CPU cost per response.
+
+Run with `python -m benchmarks.compression`
+"""
+import json
+import time
+from typing import Annotated
+
+import typer
+
+from app.web.compression import (
+    BROTLI,
+    GZIP,
+    CompressionMiddleware,
+    brotli,
+)
+
+ROW_HTML = (
+    '<li id="todo-{id}" class=" hover:bg-teal-50 py-6 px-4 text-lg">'
+    '<form class="group flex justify-between items-center gap-6">'
+    '<input name="todo_id" type="hidden" value="{id}" />'
+    '<input type="text" name="title" value="Todo number {id}" '
+    'hx-patch="/todos/{id}" hx-target="closest li" hx-swap="outerHTML" />'
+    "</form></li>"
+)
+
+
+def _json_payload(rows: int) -> bytes:
+    todos = [
+        {
+            "id": i,
+            "title": f"Todo number {i}",
+            "description": "Doesn't matter...",
+            "priority": i % 5 + 1,
+            "completed": i % 3 == 0,
+        }
+        for i in range(1, rows + 1)
+    ]
+    return json.dumps(todos).encode()
+
+
+def _html_payload(rows: int) -> bytes:
+    return "".join(ROW_HTML.format(id=i) for i in range(1, rows + 1)).encode()
+
+
+def _measure(
+    middleware: CompressionMiddleware, encoding: str, body: bytes, repeat: int
+) -> tuple[int, float]:
+    """Return (compressed size, mean CPU milliseconds per response)."""
+    size = 0
+    start = time.process_time()
+    for _ in range(repeat):
+        compressor = middleware.make_compressor(encoding)
+        size = len(compressor.compress(body) + compressor.finish())
+    elapsed = time.process_time() - start
+    return size, elapsed / repeat * 1000
+
+
+cli_app = typer.Typer(add_completion=False)
+
+
+@cli_app.command()
+def main(
+    rows: Annotated[int, typer.Option(help="Todos per payload.")] = 1000,
+    repeat: Annotated[int, typer.Option(help="Compressions per measurement.")] = 50,
+) -> None:
+    """Compare raw and compressed sizes for the todos JSON list and HTML page."""
+    middleware = CompressionMiddleware(app=None)  # type: ignore[arg-type]
+    encodings = [GZIP] + ([BROTLI] if brotli is not None else [])
+    payloads = {"json": _json_payload(rows), "html": _html_payload(rows)}
+    typer.echo(
+        f"{'payload':<8}{'encoding':<10}{'raw':>10}{'wire':>10}"
+        f"{'ratio':>8}{'cpu ms':>10}"
+    )
+    for name, body in payloads.items():
+        for encoding in encodings:
+            size, cpu_ms = _measure(middleware, encoding, body, repeat)
+            typer.echo(
+                f"{name:<8}{encoding:<10}{len(body):>10}{size:>10}"
+                f"{len(body) / size:>8.1f}{cpu_ms:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    cli_app()
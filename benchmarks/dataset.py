@@ -0,0 +1,20 @@
+"""Benchmark datasets, built with `scripts.populate_db`.
+
+Todos are spread evenly over `USERS` users, so user 1 owns `rows / USERS`.
+"""
+from sqlalchemy import Engine
+
+from app.datastore import db_models
+from scripts import populate_db
+from scripts.populate_db import PASSWORD, username  # noqa: F401
+
+USERS = 100
+
+
+def reset_schema(engine: Engine) -> None:
+    db_models.Base.metadata.drop_all(engine)
+    db_models.Base.metadata.create_all(engine)
+
+
+def populate(engine: Engine, rows: int, seed: int = 0) -> None:
+    populate_db.populate(engine, users=USERS, todos_total=rows, skew=0.0, seed=seed)
@@ -0,0 +1,467 @@
+"""HTTP benchmark suite for the API and HTML routes.
+
+Drives `app.web.main:app` either in-process, through httpx's ASGI transport
+(no network, measures the app itself), or through a real uvicorn server (adds
+the server and the network stack). For each dataset size, the database is
+rebuilt, then each scenario (login, list/get/create/patch/delete todos on the
+API and HTML routes, polling a background job's status) is run as user 1, and its throughput and p50/p95/p99
+latency are reported.
+
+Results are written as JSON. Pass a previous run's results as `--baseline` to
+flag scenarios whose p95 latency or throughput got worse by more than the
+tolerance; the command then exits with status 1.
+
+Run with `python -m benchmarks.routes --help`
+"""
+import os
+import tempfile
+from pathlib import Path
+
+# The app's engine is created on import, so point it at the benchmark database
+# before anything imports the app (hence the late imports below).
+BENCH_DB_PATH = Path(tempfile.gettempdir()) / "todo-app-benchmark.db"
+os.environ["DB_URL"] = f"sqlite:///{BENCH_DB_PATH}"
+
+import asyncio
+import json
+import platform
+import re
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from functools import partial
+from typing import Annotated, Any
+
+import httpx
+import typer
+from sqlalchemy import select
+
+from app.datastore import db_models
+from app.datastore.database import SessionLocal, engine
+from app.services.write_buffer import todo_write_buffer
+from benchmarks import dataset
+
+# ----------- Constants -----------
+ASGI = "asgi"
+UVICORN = "uvicorn"
+DEFAULT_ROWS = "1000,100000,1000000"
+SERVER_START_TIMEOUT = 30.0  # seconds
+USER_ID = 1
+ACCESS_TOKEN_COOKIE = "access_token"
+_HTML_TODO_ID = re.compile(r'id="todo-(\d+)"')
+
+
+@dataclass
+class Context:
+    """State shared by a run's scenarios."""
+
+    todo_ids: list[int]
+    api_headers: dict[str, str] = field(default_factory=dict)
+    created_api_ids: list[int] = field(default_factory=list)
+    created_html_ids: list[int] = field(default_factory=list)
+    job_location: str = ""
+
+
+@dataclass
+class Result:
+    transport: str
+    rows: int
+    scenario: str
+    requests: int
+    errors: int
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+# ----------- Scenarios -----------
+# Each makes its i-th request with either the API or the (cookie) HTML client.
+Scenario = Callable[[httpx.AsyncClient, Context, int], Awaitable[httpx.Response]]
+
+
+async def api_login(client: httpx.AsyncClient, ctx: Context, i: int):
+    return await client.post(
+        "/api/auth/token",
+        data={"username": dataset.username(USER_ID), "password": dataset.PASSWORD},
+    )
+
+
+async def api_list(client: httpx.AsyncClient, ctx: Context, i: int):
+    return await client.get("/api/todos", headers=ctx.api_headers)
+
+
+async def api_get(client: httpx.AsyncClient, ctx: Context, i: int):
+    todo_id = ctx.todo_ids[i % len(ctx.todo_ids)]
+    return await client.get(f"/api/todos/{todo_id}", headers=ctx.api_headers)
+
+
+async def api_create(client: httpx.AsyncClient, ctx: Context, i: int):
+    response = await client.post(
+        "/api/todos",
+        headers=ctx.api_headers,
+        json={
+            "title": f"Benchmark todo {i}",
+            "description": "Created by the benchmark",
+            "priority": 3,
+            "completed": False,
+        },
+    )
+    if response.status_code == 201:
+        ctx.created_api_ids.append(response.json()["id"])
+    return response
+
+
+async def api_patch(client: httpx.AsyncClient, ctx: Context, i: int):
+    todo_id = ctx.todo_ids[i % len(ctx.todo_ids)]
+    return await client.patch(
+        f"/api/todos/{todo_id}",
+        headers=ctx.api_headers,
+        json={"title": f"Patched todo {i}"},
+    )
+
+
+async def api_delete(client: httpx.AsyncClient, ctx: Context, i: int):
+    todo_id = ctx.created_api_ids.pop()
+    return await client.delete(f"/api/todos/{todo_id}", headers=ctx.api_headers)
+
+
+async def api_job(client: httpx.AsyncClient, ctx: Context, i: int):
+    return await client.get(ctx.job_location, headers=ctx.api_headers)
+
+
+async def html_login(client: httpx.AsyncClient, ctx: Context, i: int):
+    return await client.post(
+        "/users/login",
+        data={"username": dataset.username(USER_ID), "password": dataset.PASSWORD},
+    )
+
+
+async def html_list(client: httpx.AsyncClient, ctx: Context, i: int):
+    return await client.get("/todos")
+
+
+async def html_create(client: httpx.AsyncClient, ctx: Context, i: int):
+    response = await client.post("/todos", data={"title": f"Benchmark {i}"})
+    if match := _HTML_TODO_ID.search(response.text):
+        ctx.created_html_ids.append(int(match.group(1)))
+    return response
+
+
+async def html_patch(client: httpx.AsyncClient, ctx: Context, i: int):
+    todo_id = ctx.todo_ids[i % len(ctx.todo_ids)]
+    return await client.patch(f"/todos/{todo_id}", data={"title": f"Patched {i}"})
+
+
+async def html_delete(client: httpx.AsyncClient, ctx: Context, i: int):
+    todo_id = ctx.created_html_ids.pop()
+    return await client.delete(f"/todos/{todo_id}")
+
+
+# Run in this order: creates feed the deletes.
+API_SCENARIOS: dict[str, Scenario] = {
+    "api_login": api_login,
+    "api_list": api_list,
+    "api_get": api_get,
+    "api_create": api_create,
+    "api_patch": api_patch,
+    "api_delete": api_delete,
+    "api_job": api_job,
+}
+HTML_SCENARIOS: dict[str, Scenario] = {
+    "html_login": html_login,
+    "html_list": html_list,
+    "html_create": html_create,
+    "html_patch": html_patch,
+    "html_delete": html_delete,
+}
+# Any other status counts as an error, e.g. a redirect to the login page
+EXPECTED_STATUS: dict[str, int] = {
+    "api_login": 200,
+    "api_list": 200,
+    "api_get": 200,
+    "api_create": 201,
+    "api_patch": 200,
+    "api_delete": 204,
+    "api_job": 200,
+    "html_login": 302,
+    "html_list": 200,
+    "html_create": 200,
+    "html_patch": 204,
+    "html_delete": 200,
+}
+
+
+# ----------- Running -----------
+def percentile(sorted_values: list[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+async def run_scenario(
+    scenario: Scenario,
+    client: httpx.AsyncClient,
+    ctx: Context,
+    requests: int,
+    concurrency: int,
+    expected_status: int,
+) -> tuple[list[float], int, float]:
+    """Make `requests` requests, `concurrency` at a time.
+
+    Returns the latencies (ms), the number of responses without the expected
+    status (e.g. a redirect to the login page), and wall time (s).
+    """
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await scenario(client, ctx, i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != expected_status:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_suite(
+    client_factory: Callable[[], httpx.AsyncClient],
+    transport: str,
+    rows: int,
+    requests: int,
+    concurrency: int,
+) -> list[Result]:
+    with SessionLocal() as db:
+        todo_ids = list(
+            db.scalars(
+                select(db_models.Todo.id)
+                .where(db_models.Todo.owner_id == USER_ID)
+                .limit(1_000)
+            )
+        )
+    ctx = Context(todo_ids=todo_ids)
+    results = []
+    async with client_factory() as api_client, client_factory() as html_client:
+        token = (await api_login(api_client, ctx, 0)).json()["access_token"]
+        ctx.api_headers = {"Authorization": f"Bearer {token}"}
+        # Submit a background job once; `api_job` then polls its Location.
+        export = await api_client.post("/api/todos/export", headers=ctx.api_headers)
+        if export.status_code != 202 or "location" not in export.headers:
+            raise RuntimeError(f"export wasn't accepted: {export.status_code}")
+        ctx.job_location = export.headers["location"]
+        # The login cookie is `secure`, so httpx won't send it back over plain
+        # http: set it on the client without the flag.
+        login = await html_login(html_client, ctx, 0)
+        html_client.cookies.set(ACCESS_TOKEN_COOKIE, login.cookies[ACCESS_TOKEN_COOKIE])
+
+        suites = ((api_client, API_SCENARIOS), (html_client, HTML_SCENARIOS))
+        for client, scenarios in suites:
+            for name, scenario in scenarios.items():
+                count = requests
+                if scenario is api_delete:
+                    count = len(ctx.created_api_ids)
+                elif scenario is html_delete:
+                    count = len(ctx.created_html_ids)
+                latencies, errors, wall = await run_scenario(
+                    scenario, client, ctx, count, concurrency, EXPECTED_STATUS[name]
+                )
+                latencies.sort()
+                results.append(
+                    Result(
+                        transport=transport,
+                        rows=rows,
+                        scenario=name,
+                        requests=len(latencies),
+                        errors=errors,
+                        throughput_rps=len(latencies) / wall if wall else 0.0,
+                        p50_ms=percentile(latencies, 50) if latencies else 0.0,
+                        p95_ms=percentile(latencies, 95) if latencies else 0.0,
+                        p99_ms=percentile(latencies, 99) if latencies else 0.0,
+                    )
+                )
+                _echo_result(results[-1])
+    # Write buffered HTML edits while this event loop is still running.
+    todo_write_buffer.flush()
+    return results
+
+
+def rebuild_database(rows: int, seed: int) -> None:
+    engine.dispose()
+    BENCH_DB_PATH.unlink(missing_ok=True)
+    db_models.Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    dataset.populate(engine, rows=rows, seed=seed)
+    typer.echo(f"populated {rows} todos in {time.perf_counter() - start:.1f}s")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+    return port
+
+
+def start_uvicorn(port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.web.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ.copy(),
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1.0)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn didn't start in time")
+
+
+# ----------- Reporting -----------
+def _echo_result(result: Result) -> None:
+    typer.echo(
+        f"{result.transport:<9}{result.rows:>9} {result.scenario:<13}"
+        f"{result.throughput_rps:>9.1f}{result.p50_ms:>9.2f}{result.p95_ms:>9.2f}"
+        f"{result.p99_ms:>9.2f}{result.errors:>7}"
+    )
+
+
+def compare(
+    results: list[Result], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Describe each result that regressed against the baseline."""
+    previous = {
+        (r["transport"], r["rows"], r["scenario"]): r for r in baseline["results"]
+    }
+    regressions = []
+    for result in results:
+        base = previous.get((result.transport, result.rows, result.scenario))
+        if base is None:
+            continue
+        label = f"{result.transport} {result.rows} {result.scenario}"
+        if result.p95_ms > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{label}: p95 {base['p95_ms']:.2f} -> {result.p95_ms:.2f} ms"
+            )
+        if result.throughput_rps < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {base['throughput_rps']:.1f} -> "
+                f"{result.throughput_rps:.1f} req/s"
+            )
+    return regressions
+
+
+cli_app = typer.Typer(add_completion=False)
+
+
+@cli_app.command()
+def main(
+    rows: Annotated[
+        str, typer.Option(help="Comma-separated dataset sizes (todos).")
+    ] = DEFAULT_ROWS,
+    transports: Annotated[
+        str, typer.Option(help=f"Comma-separated: {ASGI}, {UVICORN}.")
+    ] = f"{ASGI},{UVICORN}",
+    requests: Annotated[int, typer.Option(help="Requests per scenario.")] = 200,
+    concurrency: Annotated[int, typer.Option(help="Concurrent clients.")] = 10,
+    seed: Annotated[int, typer.Option(help="Random seed for the dataset.")] = 0,
+    output: Annotated[Path, typer.Option(help="Where to write results.")] = Path(
+        "benchmark-results.json"
+    ),
+    baseline: Annotated[
+        Path | None, typer.Option(help="Results to compare against.")
+    ] = None,
+    tolerance: Annotated[
+        float, typer.Option(help="Allowed regression, as a fraction.")
+    ] = 0.1,
+) -> None:
+    """Benchmark the app's routes and compare against a baseline."""
+    from app.web.main import app
+
+    results: list[Result] = []
+    typer.echo(
+        f"{'transport':<9}{'rows':>9} {'scenario':<13}{'req/s':>9}{'p50':>9}"
+        f"{'p95':>9}{'p99':>9}{'errors':>7}"
+    )
+    for size in (int(value) for value in rows.split(",")):
+        for transport in transports.split(","):
+            rebuild_database(rows=size, seed=seed)
+            if transport == ASGI:
+                asgi = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+                results += asyncio.run(
+                    run_suite(
+                        partial(
+                            httpx.AsyncClient,
+                            transport=asgi,
+                            base_url="http://benchmark",
+                        ),
+                        transport,
+                        size,
+                        requests,
+                        concurrency,
+                    )
+                )
+            elif transport == UVICORN:
+                port = _free_port()
+                server = start_uvicorn(port)
+                try:
+                    results += asyncio.run(
+                        run_suite(
+                            partial(
+                                httpx.AsyncClient, base_url=f"http://127.0.0.1:{port}"
+                            ),
+                            transport,
+                            size,
+                            requests,
+                            concurrency,
+                        )
+                    )
+                finally:
+                    server.terminate()
+                    server.wait()
+            else:
+                raise typer.BadParameter(f"Unknown transport: {transport}")
+
+    output.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.now(UTC).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "requests": requests,
+                "concurrency": concurrency,
+                "results": [asdict(result) for result in results],
+            },
+            indent=2,
+        )
+    )
+    typer.echo(f"wrote {output}")
+
+    if baseline is not None:
+        regressions = compare(results, json.loads(baseline.read_text()), tolerance)
+        for regression in regressions:
+            typer.echo(f"REGRESSION {regression}", err=True)
+        if regressions:
+            raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,82 @@
+"""Benchmark todo full-text search against a LIKE scan.
+
+Builds a throwaway SQLite database of `--rows` todos, then times searches
+through `todo_search` and the equivalent `LIKE '%term%'` query.
+
+Run with `python -m benchmarks.search`
+"""
+import statistics
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from sqlalchemy import create_engine, or_, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.datastore import db_models
+from app.services import todo_search
+from benchmarks import dataset
+
+
+def _like_search(db: Session, owner_id: int, query: str, limit: int) -> list:
+    statement = select(db_models.Todo).where(db_models.Todo.owner_id == owner_id)
+    for term in todo_search.parse_terms(query):
+        statement = statement.where(
+            or_(
+                db_models.Todo.title.like(f"%{term}%"),
+                db_models.Todo.description.like(f"%{term}%"),
+            )
+        )
+    return list(db.scalars(statement.order_by(db_models.Todo.id).limit(limit)))
+
+
+def _time_ms(fn, repeat: int) -> float:
+    """Median wall-clock milliseconds per call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+cli_app = typer.Typer(add_completion=False)
+
+
+@cli_app.command()
+def main(
+    rows: Annotated[int, typer.Option(help="Todos in the dataset.")] = 1_000_000,
+    repeat: Annotated[int, typer.Option(help="Runs per query.")] = 20,
+    limit: Annotated[int, typer.Option(help="Page size.")] = 20,
+    seed: Annotated[int, typer.Option(help="Random seed for the dataset.")] = 0,
+) -> None:
+    """Compare full-text search and LIKE latency for a few queries."""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'search.db'}")
+        dataset.reset_schema(engine)
+        session_factory = sessionmaker(engine)
+
+        start = time.perf_counter()
+        dataset.populate(engine, rows=rows, seed=seed)
+        typer.echo(f"populated {rows} todos in {time.perf_counter() - start:.1f}s")
+
+        typer.echo(f"{'query':<22}{'fts ms':>10}{'like ms':>10}{'hits':>6}")
+        with session_factory() as db:
+            for query in ("milk", "gro", "pay rent", "dentist app", "passport taxes"):
+                page = todo_search.search_todos(db, 1, query, limit=limit)
+                fts_ms = _time_ms(
+                    partial(todo_search.search_todos, db, 1, query, limit=limit),
+                    repeat,
+                )
+                like_ms = _time_ms(partial(_like_search, db, 1, query, limit), repeat)
+                typer.echo(
+                    f"{query:<22}{fts_ms:>10.2f}{like_ms:>10.2f}{len(page.todos):>6}"
+                )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    cli_app()
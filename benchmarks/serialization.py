@@ -0,0 +1,100 @@
+"""Benchmark API list serialization: FastAPI's default path against the fast path.
+
+Serves the same list of (transient) ORM todos from three routes of a small
+app, in-process, and times a full request for each:
+
+- `default`: `response_model` validation, `jsonable_encoder`, stdlib `json`;
+- `fast_class`: the same, but rendered with `FastJSONResponse`;
+- `model_response`: validated once and dumped in pydantic-core.
+
+Run with `python -m benchmarks.serialization`
+"""
+import asyncio
+import statistics
+import time
+from typing import Annotated
+
+import httpx
+import typer
+from fastapi import FastAPI
+from starlette.responses import Response
+
+from app.datastore import db_models
+from app.web.api import api_models, responses
+from app.web.api.routes.todos import TODO_LIST
+
+DEFAULT_SIZES = "1000,10000,100000"
+PATHS = ("/default", "/fast_class", "/model_response")
+
+
+def _make_app(rows: list[db_models.Todo]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default", response_model=list[api_models.TodoOutLimited])
+    async def default() -> list[db_models.Todo]:
+        return rows
+
+    @app.get(
+        "/fast_class",
+        response_model=list[api_models.TodoOutLimited],
+        response_class=responses.FastJSONResponse,
+    )
+    async def fast_class() -> list[db_models.Todo]:
+        return rows
+
+    @app.get("/model_response", response_model=list[api_models.TodoOutLimited])
+    async def model_response() -> Response:
+        return responses.model_response(TODO_LIST, rows)
+
+    return app
+
+
+def _make_rows(size: int) -> list[db_models.Todo]:
+    return [
+        db_models.Todo(
+            id=i,
+            title=f"Todo number {i}",
+            description="Doesn't matter...",
+            priority=i % 5 + 1,
+            completed=i % 3 == 0,
+            owner_id=1,
+        )
+        for i in range(1, size + 1)
+    ]
+
+
+async def _time_path(app: FastAPI, path: str, repeat: int) -> float:
+    """Median milliseconds per request."""
+    transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    timings = []
+    async with client:
+        await client.get(path)  # warm up
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = await client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+    return statistics.median(timings)
+
+
+cli_app = typer.Typer(add_completion=False)
+
+
+@cli_app.command()
+def main(
+    sizes: Annotated[
+        str, typer.Option(help="Comma-separated list sizes (todos).")
+    ] = DEFAULT_SIZES,
+    repeat: Annotated[int, typer.Option(help="Requests per measurement.")] = 10,
+) -> None:
+    """Compare serialization paths for todo lists of each size."""
+    typer.echo(f"{'rows':>8}" + "".join(f"{path[1:]:>16}" for path in PATHS))
+    for size in (int(value) for value in sizes.split(",")):
+        app = _make_app(_make_rows(size))
+        timings = [asyncio.run(_time_path(app, path, repeat)) for path in PATHS]
+        typer.echo(f"{size:>8}" + "".join(f"{ms:>13.2f} ms" for ms in timings))
+
+
+if __name__ == "__main__":
+    cli_app()
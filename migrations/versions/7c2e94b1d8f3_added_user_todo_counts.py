@@ -0,0 +1,36 @@
+"""added user todo counts
+
+Revision ID: 7c2e94b1d8f3
+Revises: 2a8f5c17e6b4
+Create Date: 2026-10-18 13:21:07.402913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e94b1d8f3'
+down_revision: Union[str, None] = '2a8f5c17e6b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('open_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('done_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE users SET "
+        "open_count = (SELECT count(*) FROM todos "
+        "WHERE todos.owner_id = users.id AND NOT todos.completed), "
+        "done_count = (SELECT count(*) FROM todos "
+        "WHERE todos.owner_id = users.id AND todos.completed)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('done_count')
+        batch_op.drop_column('open_count')
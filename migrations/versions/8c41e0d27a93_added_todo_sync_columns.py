@@ -0,0 +1,44 @@
+"""added todo updated_at column and tombstones table
+
+Revision ID: 8c41e0d27a93
+Revises: 3b9d2f6a1c47
+Create Date: 2026-10-18 10:03:17.224905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41e0d27a93'
+down_revision: Union[str, None] = '3b9d2f6a1c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('todo_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('todo_id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_todo_tombstones_owner_id_deleted_at', 'todo_tombstones', ['owner_id', 'deleted_at'], unique=False)
+    # Existing rows are backfilled before the column becomes NOT NULL
+    # (SQLite can't add a column with a non-constant default).
+    op.add_column('todos', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute('UPDATE todos SET updated_at = CURRENT_TIMESTAMP')
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+    op.create_index('ix_todos_owner_id_updated_at', 'todos', ['owner_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_owner_id_updated_at', table_name='todos')
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.drop_column('updated_at')
+    op.drop_index('ix_todo_tombstones_owner_id_deleted_at', table_name='todo_tombstones')
+    op.drop_table('todo_tombstones')
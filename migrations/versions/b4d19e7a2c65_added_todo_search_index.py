@@ -0,0 +1,62 @@
+"""added todo search index
+
+Revision ID: b4d19e7a2c65
+Revises: 7c2e94b1d8f3
+Create Date: 2026-10-18 14:02:51.837140
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d19e7a2c65'
+down_revision: Union[str, None] = '7c2e94b1d8f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX ix_todos_search ON todos USING gin ("
+            "setweight(to_tsvector('english'::regconfig, title), 'A') || "
+            "setweight(to_tsvector('english'::regconfig, description), 'B'))"
+        )
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE todos_fts USING fts5("
+        "title, description, content='todos', content_rowid='id', prefix='2 3')"
+    )
+    op.execute(
+        "CREATE TRIGGER todos_fts_ai AFTER INSERT ON todos BEGIN "
+        "INSERT INTO todos_fts(rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END"
+    )
+    op.execute(
+        "CREATE TRIGGER todos_fts_ad AFTER DELETE ON todos BEGIN "
+        "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END"
+    )
+    op.execute(
+        "CREATE TRIGGER todos_fts_au AFTER UPDATE OF title, description "
+        "ON todos BEGIN "
+        "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO todos_fts(rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END"
+    )
+    # Index the existing todos
+    op.execute("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_todos_search', table_name='todos')
+        return
+    op.execute("DROP TRIGGER IF EXISTS todos_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS todos_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS todos_fts_ai")
+    op.execute("DROP TABLE IF EXISTS todos_fts")
@@ -0,0 +1,30 @@
+"""added version columns
+
+Revision ID: d5a7c3e91f02
+Revises: 8c41e0d27a93
+Create Date: 2026-10-18 10:48:52.910377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a7c3e91f02'
+down_revision: Union[str, None] = '8c41e0d27a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('todos', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('users', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,42 @@
+"""cascade todo deletes from owner
+
+Revision ID: f1e6b8a4d290
+Revises: d5a7c3e91f02
+Create Date: 2026-10-18 11:26:05.671843
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1e6b8a4d290'
+down_revision: Union[str, None] = 'd5a7c3e91f02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The original foreign key was unnamed: SQLite batch mode reflects it under this
+# naming convention, while Postgres named it itself.
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+SQLITE_FK_NAME = 'fk_todos_owner_id_users'
+POSTGRES_FK_NAME = 'todos_owner_id_fkey'
+
+
+def _replace_owner_fk(ondelete: Union[str, None]) -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('todos', naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(SQLITE_FK_NAME, type_='foreignkey')
+            batch_op.create_foreign_key(SQLITE_FK_NAME, 'users', ['owner_id'], ['id'], ondelete=ondelete)
+    else:
+        op.drop_constraint(POSTGRES_FK_NAME, 'todos', type_='foreignkey')
+        op.create_foreign_key(POSTGRES_FK_NAME, 'todos', 'users', ['owner_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    _replace_owner_fk(ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    _replace_owner_fk(ondelete=None)